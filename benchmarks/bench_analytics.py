@@ -0,0 +1,74 @@
+"""
+Время каждого аналитического метода DataBase на синтетических базах
+разного размера: холодный вызов (кеш запросов сброшен) и повторный
+из кеша, плюс полный пересчет RepoRollup.
+
+Запуск из корня проекта (база на 10M строк создается несколько минут):
+    python benchmarks/bench_analytics.py --rows 100000 1000000 10000000 --output analytics.json
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from results import write_results
+from synthetic import make_database
+
+from db_manager import DataBase
+
+
+async def measure(call, repeat: int, before=None) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - started)
+    return {"min": min(timings), "median": statistics.median(timings)}
+
+
+async def run(path: str, repeat: int) -> dict[str, dict]:
+    db = DataBase(f"sqlite+aiosqlite:///{path}")
+    await db.init()
+    year = (await db.max_date()).year
+    calls = {
+        "get_rollup": db.get_rollup,
+        "get_active_repository_lifespans": db.get_active_repository_lifespans,
+        "get_language": lambda: db.get_language(year),
+        "get_count_last_push": db.get_count_last_push,
+        "get_count_created_repo": db.get_count_created_repo,
+        "min_date": db.min_date,
+        "max_date": db.max_date,
+    }
+    timings = {"rebuild_rollup": await measure(db.rebuild_rollup, repeat)}
+    for name, call in calls.items():
+        timings[name] = await measure(call, repeat, before=db.invalidate_cache)
+        if hasattr(getattr(DataBase, name), "__wrapped__"): # обернут cached_query
+            timings[f"{name}_cached"] = await measure(call, repeat)
+    await db.close()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Аналитика DataBase на синтетических базах")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждого замера")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл JSON с результатами")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            path = os.path.join(directory, f"bench_{rows}.db")
+            make_database(path, rows, args.seed)
+            results.append({"rows": rows, "seconds": asyncio.run(run(path, args.repeat))})
+            os.remove(path)
+    write_results(args.output, "analytics", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
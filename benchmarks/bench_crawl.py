@@ -0,0 +1,218 @@
+"""
+Сквозной бенчмарк сбора: App.fetch_and_save_repos против заглушки GitHub,
+запущенной в этом же процессе (в отдельном потоке со своим event loop).
+Заглушка отдает детерминированные страницы, заголовки лимитов, вторичные
+лимиты 403 и сетевую задержку; данные пишутся во временную базу SQLite.
+С --shards обход идет распределенно: процессы-воркеры (--processes) делят
+токены и шарды, результат переносится в основную базу. С --refresh-days
+после обхода замеряется обновление активности за последние дни, с --refresh -
+с момента обхода по его журналу (после --shards журнал переносится из шардов). С --recrawl
+после обхода замеряется повторный полный обход: окна выровнены по UTC,
+поэтому их запросы повторяются и заглушка отвечает 304 по ETag первого обхода.
+
+Запуск из корня проекта:
+    python benchmarks/bench_crawl.py --years 1 --density 0.002 --output crawl.json
+    python benchmarks/bench_crawl.py --years 4 --tokens 4 --shards 16 --processes 4
+    python benchmarks/bench_crawl.py --years 2 --refresh-days 7
+    python benchmarks/bench_crawl.py --years 2 --shards 8 --refresh
+    python benchmarks/bench_crawl.py --years 2 --recrawl
+    python benchmarks/bench_crawl.py --years 2 --shards 8 --recrawl
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Адрес API подставляется в Fetcher при импорте settings, поэтому задается заранее.
+# Процессы-воркеры импортируют этот модуль заново и берут порт и каталог из окружения
+PORT = int(os.environ.setdefault("BENCH_STUB_PORT", str(free_port())))
+TEMP = os.environ.setdefault("BENCH_TEMP", tempfile.mkdtemp(prefix="bench_crawl_"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+os.environ["API_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("PATH_TO_TOKENS", "github_tokens.txt")
+os.environ.setdefault("DEBUG", "false")
+
+from results import write_results
+from stub_server import StubServer
+
+from db_manager import REFRESH_WATERMARK, DataBase
+from metrics import PAGES, registry
+from save_data import App, crawl_sharded
+from settings import settings
+from token_provider import TokenProvider
+
+
+class StubThread:
+    """Заглушка в отдельном потоке: ее работа не занимает event loop краулера."""
+    def __init__(self, port: int, **options) -> None:
+        self.__port = port
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__loop.run_forever, daemon=True)
+        self.server = StubServer(**options)
+
+
+    def __enter__(self) -> StubServer:
+        self.__thread.start()
+        asyncio.run_coroutine_threadsafe(
+            self.server.start(port=self.__port), self.__loop
+        ).result()
+        return self.server
+
+
+    def __exit__(self, *exc_info) -> None:
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+
+
+def configure(name: str, value) -> None:
+    """Настройка для этого процесса и для процессов-воркеров, которые прочтут окружение."""
+    setattr(settings, name, value)
+    os.environ[name.upper()] = str(value)
+
+
+async def crawl(path: str, shards: int | None, processes: int) -> float:
+    db = DataBase(f"sqlite+aiosqlite:///{path}")
+    await db.init()
+    started = time.perf_counter()
+    try:
+        if shards is None:
+            await App(db, TokenProvider(settings.path_to_tokens)).fetch_and_save_repos()
+        else:
+            await crawl_sharded(db, shards, processes)
+    finally:
+        await db.close()
+    return time.perf_counter() - started
+
+
+async def refresh(path: str, days: Optional[int]) -> float:
+    """
+    Обновление активности после полного обхода: за последние days дней или,
+    без days, с момента обхода по его журналу, как save --refresh без отметки.
+    """
+    db = DataBase(f"sqlite+aiosqlite:///{path}")
+    await db.init()
+    if days is not None:
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+        await db.set_meta(REFRESH_WATERMARK, since.isoformat())
+    started = time.perf_counter()
+    try:
+        await App(db, TokenProvider(settings.path_to_tokens)).refresh_activity()
+        if await db.get_meta(REFRESH_WATERMARK) is None:
+            raise RuntimeError("Обновление не нашло обход в журнале основной базы")
+    finally:
+        await db.close()
+    return time.perf_counter() - started
+
+
+def run(args: argparse.Namespace) -> dict:
+    token_path = os.path.join(TEMP, "tokens.txt") # фиктивные токены для заглушки
+    with open(token_path, "w") as file:
+        file.writelines(f"bench-token-{i}\n" for i in range(args.tokens))
+    path = os.path.join(TEMP, "bench.db")
+    os.chdir(TEMP) # журналы процессов-воркеров
+    configure("path_to_tokens", token_path)
+    configure("db_url", f"sqlite+aiosqlite:///{path}")
+    configure("shard_staging_url", f"sqlite+aiosqlite:///{TEMP}/staging/shard-{{shard}}.db")
+    configure("fetch_years", args.years)
+    configure("workers_per_token", args.workers_per_token)
+    configure("max_concurrency", args.max_concurrency)
+    configure("conditional_requests", True)
+
+    stub = StubThread(
+        PORT,
+        latency=args.latency,
+        density=args.density,
+        rate_limit=args.rate_limit,
+        secondary_rate=args.secondary_rate,
+        seed=args.seed,
+    )
+    pages_before = PAGES.total()
+    with stub as server:
+        elapsed = asyncio.run(crawl(path, args.shards, args.processes))
+        requests = server.requests
+        # Страницы, обработанные процессами-воркерами, видны только по ответам заглушки
+        pages = PAGES.total() - pages_before if args.shards is None else server.statuses.get(200, 0)
+        rows = sqlite3.connect(path).execute("SELECT count(*) FROM repoinfo").fetchone()[0]
+        if args.recrawl:
+            not_modified = server.statuses.get(304, 0)
+            recrawl_elapsed = asyncio.run(crawl(path, args.shards, args.processes))
+            recrawl_requests = server.requests - requests
+            recrawl_not_modified = server.statuses.get(304, 0) - not_modified
+        refresh_requests = server.requests
+        if args.refresh_days is not None or args.refresh:
+            refresh_elapsed = asyncio.run(refresh(path, args.refresh_days))
+
+    snapshot = registry.snapshot()
+    os.remove(path)
+    result = {
+        "seconds": elapsed,
+        "pages": pages,
+        "rows": rows,
+        "pages_per_second": pages / elapsed,
+        "rows_per_second": rows / elapsed,
+        "requests": requests,
+        "connections": server.connections,
+        "statuses": server.statuses,
+        "request_seconds": snapshot["github_request_seconds"],
+        "parse_seconds": snapshot["github_parse_seconds"],
+        "db_flush_seconds": snapshot["db_flush_seconds"],
+        "retries": snapshot["crawl_retries_total"],
+    }
+    if args.recrawl:
+        result["recrawl_seconds"] = recrawl_elapsed
+        result["recrawl_requests"] = recrawl_requests
+        result["recrawl_not_modified"] = recrawl_not_modified
+    if args.refresh_days is not None or args.refresh:
+        result["refresh_seconds"] = refresh_elapsed
+        result["refresh_requests"] = server.requests - refresh_requests
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк сбора против заглушки GitHub")
+    parser.add_argument("--years", type=int, default=1, help="лет истории для обхода")
+    parser.add_argument("--density", type=float, default=0.002, help="репозиториев в секунду окна")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа заглушки, с")
+    parser.add_argument("--tokens", type=int, default=2)
+    parser.add_argument("--workers-per-token", type=int, default=settings.workers_per_token)
+    parser.add_argument("--max-concurrency", type=int, default=settings.max_concurrency)
+    parser.add_argument("--rate-limit", type=int, default=1_000_000, help="запросов токена в минуту")
+    parser.add_argument("--secondary-rate", type=float, default=0.0, help="доля ответов 403 вторичного лимита")
+    parser.add_argument("--shards", type=int, help="распределенный обход не меньше чем на столько шардов")
+    parser.add_argument("--processes", type=int, default=2, help="процессов-воркеров с --shards")
+    parser.add_argument("--refresh-days", type=int, help="замерить обновление активности за N дней")
+    parser.add_argument("--refresh", action="store_true", help="замерить обновление активности с момента обхода")
+    parser.add_argument("--recrawl", action="store_true", help="замерить повторный полный обход (304 по ETag)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл JSON с результатами")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        filename=os.path.join(TEMP, "app_log.log"),
+        format="%(asctime)s%(levelname)s %(message)s",
+    )
+    results = [run(args)]
+    write_results(args.output, "crawl", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Пропускная способность Fetcher против локальной заглушки GitHub в раскладке
+краулера: на каждый токен workers воркеров, каждый воркер делает запросы
+по одному. Сравниваются клиент на каждого воркера с одним соединением
+(раскладка до общего пула) и общий клиент токена с пулами разных размеров.
+Заглушка говорит только HTTP/1.1, поэтому HTTP/2 здесь не измеряется.
+
+Запуск из корня проекта:
+    python benchmarks/bench_fetcher.py --pages 400 --tokens 2 --workers 4 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("PATH_TO_TOKENS", "github_tokens.txt")
+
+from stub_server import StubServer
+
+from fetcher import Fetcher
+from token_provider import Token
+
+
+async def crawl(lanes: list[Fetcher], pages: int) -> float:
+    """Воркеры разбирают общую очередь страниц, как CrawlEngine. :return: Страниц в секунду"""
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for page in range(pages):
+        queue.put_nowait(page)
+
+    async def worker(fetcher: Fetcher) -> None:
+        while not queue.empty():
+            page = queue.get_nowait()
+            await fetcher.fetch_repos_page(page % 10 + 1, f"stars:>{page // 10}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(fetcher) for fetcher in lanes))
+    return pages / (time.perf_counter() - started)
+
+
+async def run_layout(
+        server: StubServer,
+        tokens: int,
+        workers: int,
+        pool: int | None,
+        pages: int,
+) -> tuple[float, int]:
+    """
+    :param pool: Размер пула общего клиента токена; None - клиент на каждого
+        воркера с одним соединением
+    :return: Страниц в секунду и сколько соединений открыто
+    """
+    connections = server.connections
+    if pool is None:
+        fetchers = [
+            Fetcher(Token(f"bench-{i}"), base_url=server.url, max_connections=1, http2=False)
+            for i in range(tokens)
+            for _ in range(workers)
+        ]
+        lanes = fetchers
+    else:
+        fetchers = [
+            Fetcher(Token(f"bench-{i}"), base_url=server.url, max_connections=pool, http2=False)
+            for i in range(tokens)
+        ]
+        lanes = [fetcher for fetcher in fetchers for _ in range(workers)]
+    try:
+        rate = await crawl(lanes, pages)
+    finally:
+        for fetcher in fetchers:
+            await fetcher.close()
+    return rate, server.connections - connections
+
+
+async def main(pages: int, tokens: int, workers: int, latency: float, pools: list[int]) -> None:
+    async with StubServer(latency) as server:
+        print(f"{'клиент':<26}{'стр/с':>10}{'соединений':>12}")
+        rate, connections = await run_layout(server, tokens, workers, None, pages)
+        print(f"{'клиент на воркера':<26}{rate:>10.1f}{connections:>12}")
+        for pool in pools:
+            rate, connections = await run_layout(server, tokens, workers, pool, pages)
+            print(f"{f'клиент токена, пул {pool}':<26}{rate:>10.1f}{connections:>12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--tokens", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=4, help="воркеров на токен (WORKERS_PER_TOKEN)")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка заглушки, с")
+    parser.add_argument("--pools", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    asyncio.run(main(args.pages, args.tokens, args.workers, args.latency, args.pools))
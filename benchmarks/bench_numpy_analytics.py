@@ -0,0 +1,125 @@
+"""
+Сравнение аналитики на SQL (RepoRollup и его пересчет по всей таблице)
+с векторизованным NumpyAnalytics на синтетической базе. Результаты
+NumpyAnalytics сверяются с SQL: отчеты DataBase, счетчики RepoRollup,
+матрица языков и годов (сводная таблица pandas по RepoRollup) и гистограмма
+времени жизни (группировка SQLite по сырой таблице).
+
+Запуск из корня проекта:
+    python benchmarks/bench_numpy_analytics.py --rows 1000000 10000000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from synthetic import make_database
+
+from db_manager import DataBase
+from numpy_analytics import SECONDS_PER_YEAR, NumpyAnalytics, RepoArrays
+from settings import settings
+
+
+METHODS = ["get_active_repository_lifespans", "get_count_last_push", "get_count_created_repo"]
+
+
+def sorted_rollup(rollup: pd.DataFrame) -> pd.DataFrame:
+    rollup = rollup.astype({"created_year": "int64", "pushed_year": "int64", "active": bool, "count": "int64"})
+    return rollup.sort_values(["created_year", "pushed_year", "active", "language"]).reset_index(drop=True)
+
+
+def sql_language_year_matrix(rollup: pd.DataFrame) -> pd.DataFrame:
+    """Языки активных репозиториев по годам создания: сводная таблица по RepoRollup."""
+    active = rollup[rollup["active"].astype(bool) & (rollup["language"] != "")]
+    matrix = active.pivot_table(
+        index="language", columns="created_year", values="count", aggfunc="sum", fill_value=0
+    )
+    # Годы без активных репозиториев с языком - пустые столбцы, как у NumPy
+    years = range(matrix.columns.min(), matrix.columns.max() + 1)
+    matrix = matrix.reindex(columns=years, fill_value=0).astype("int64")
+    matrix.columns = pd.Index(matrix.columns.astype("int64"), name="year")
+    return matrix
+
+
+def sql_lifespan_histogram(path: str) -> pd.DataFrame:
+    """Полных лет от создания до последнего коммита: целочисленное деление в SQLite."""
+    connection = sqlite3.connect(path)
+    rows = connection.execute(
+        f"""
+        SELECT max(CAST(strftime('%s', pushed_at) AS INTEGER) - CAST(strftime('%s', created_at) AS INTEGER), 0)
+            / {int(SECONDS_PER_YEAR)} AS years, count(*)
+        FROM repoinfo
+        GROUP BY years
+        """
+    ).fetchall()
+    connection.close()
+    counts = pd.Series(dict(rows), dtype="int64")
+    counts = counts.reindex(range(counts.index.max() + 1), fill_value=0)
+    return pd.DataFrame({"count": counts.to_numpy()}, index=pd.RangeIndex(len(counts), name="years"))
+
+
+async def run(path: str) -> dict[str, float]:
+    db = DataBase(f"sqlite+aiosqlite:///{path}")
+    await db.init()
+    timings = {}
+
+    started = time.perf_counter()
+    await db.rebuild_rollup()
+    timings["sql_rebuild_rollup"] = time.perf_counter() - started
+
+    db.invalidate_cache()
+    started = time.perf_counter()
+    sql_results = {name: await getattr(db, name)() for name in METHODS}
+    years = [int(year) for year in sql_results["get_count_created_repo"].index]
+    sql_languages = {year: await db.get_language(year) for year in years}
+    timings["sql_reports"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    arrays = await RepoArrays.from_database(db)
+    timings["numpy_load"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    analytics = NumpyAnalytics(arrays, settings.active_date)
+    numpy_results = {name: getattr(analytics, name)() for name in METHODS}
+    numpy_languages = {year: analytics.get_language(year) for year in years}
+    timings["numpy_reports"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    numpy_rollup = analytics.get_rollup()
+    numpy_matrix = analytics.language_year_matrix()
+    numpy_lifespans = analytics.lifespan_histogram()
+    timings["numpy_rollup_matrix_lifespans"] = time.perf_counter() - started
+
+    for name in METHODS:
+        pd.testing.assert_frame_equal(sql_results[name], numpy_results[name])
+    for year in years:
+        pd.testing.assert_frame_equal(sql_languages[year], numpy_languages[year])
+    sql_rollup = await db.get_rollup()
+    pd.testing.assert_frame_equal(sorted_rollup(sql_rollup), sorted_rollup(numpy_rollup))
+    pd.testing.assert_frame_equal(sql_language_year_matrix(sql_rollup), numpy_matrix)
+    pd.testing.assert_frame_equal(sql_lifespan_histogram(path), numpy_lifespans)
+
+    await db.close()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            path = os.path.join(directory, f"bench_{rows}.db")
+            make_database(path, rows)
+            timings = asyncio.run(run(path))
+            print(f"{rows} строк: " + ", ".join(f"{name}={value:.3f}s" for name, value in timings.items()))
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Микробенчмарк разбора страницы поиска: путь через pydantic/SQLModel
+(как до облегченного парсера) против parse_search_result.
+
+Запуск из корня проекта:
+    python benchmarks/bench_parse.py
+"""
+import json
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("PATH_TO_TOKENS", "github_tokens.txt")
+
+from pydantic import BaseModel
+
+from db_manager import RepoInfo
+from fetcher import parse_search_result
+
+
+def make_page(per_page: int = 100) -> bytes:
+    """Страница ответа, похожая на настоящую: у репозитория около 80 полей."""
+    items = []
+    for i in range(per_page):
+        item = {f"field_{k}": f"value {k}" for k in range(70)}
+        item["owner"] = {f"owner_{k}": f"value {k}" for k in range(18)}
+        item.update(
+            id=1_000_000 + i,
+            full_name=f"owner/repo-{i}",
+            language="Python" if i % 3 else None,
+            created_at="2020-01-01T10:00:00Z",
+            pushed_at="2024-05-01T10:00:00Z",
+        )
+        items.append(item)
+    return json.dumps({"total_count": 5000, "incomplete_results": False, "items": items}).encode()
+
+
+class LegacySearchResult(BaseModel):
+    total_count: int
+    items: list[RepoInfo]
+
+
+def legacy_parse(content: bytes) -> list[RepoInfo]:
+    """Разбор ответа и повторная валидация перед записью, как раньше."""
+    result = LegacySearchResult(**json.loads(content))
+    return [RepoInfo.model_validate(info) for info in result.items]
+
+
+def main() -> None:
+    content = make_page()
+    number = 200
+    for name, parse in (("legacy", legacy_parse), ("fast", parse_search_result)):
+        seconds = min(timeit.repeat(lambda: parse(content), number=number, repeat=5)) / number
+        print(f"{name:>8}: {seconds * 1000:.3f} мс на страницу")
+
+
+if __name__ == "__main__":
+    main()
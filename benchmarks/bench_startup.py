@@ -0,0 +1,89 @@
+"""
+Время запуска точек входа по python -X importtime: сколько занимает импорт
+модуля каждой команды и какие тяжелые пакеты он тянет. С --check завершается
+с ошибкой, если команда импортирует пакет, который ей не нужен (например,
+pandas при сборе или выгрузке), - для проверки в CI.
+
+Запуск из корня проекта:
+    python benchmarks/bench_startup.py --repeat 5 --output startup.json
+    python benchmarks/bench_startup.py --check
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from results import ROOT, write_results
+
+
+# Команда -> (импортируемый модуль, пакеты, которых при импорте быть не должно)
+ENTRY_POINTS = {
+    "cli": ("cli", ["sqlalchemy", "pandas", "matplotlib", "pydantic_settings"]),
+    "save": ("save_data", ["pandas", "numpy", "matplotlib", "pyarrow"]),
+    "analyze": ("analyze_data", ["matplotlib", "duckdb"]),
+    "export": ("export_data", ["pandas", "matplotlib"]),
+}
+HEAVY = ["sqlalchemy", "sqlmodel", "httpx", "pydantic_settings", "pandas", "numpy", "pyarrow", "matplotlib"]
+
+
+def import_profile(module: str) -> tuple[float, dict[str, int]]:
+    """
+    Импортирует модуль в отдельном интерпретаторе с -X importtime.
+    :return: Время процесса в секундах и суммарное время импорта
+        пакетов верхнего уровня в микросекундах
+    """
+    env = dict(os.environ)
+    env.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+    env.setdefault("PATH_TO_TOKENS", "github_tokens.txt")
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT / "src", env=env, capture_output=True, text=True, check=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    packages: dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue # заголовок
+        package = name.strip().split(".")[0]
+        # Пакет учитывается по самому внешнему импорту: вложенные уже входят в его время
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    return elapsed, packages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Время запуска точек входа (python -X importtime)")
+    parser.add_argument("--repeat", type=int, default=3, help="запусков каждой точки входа")
+    parser.add_argument("--check", action="store_true", help="ошибка, если импортирован лишний пакет")
+    parser.add_argument("--output", help="файл JSON с результатами")
+    args = parser.parse_args()
+
+    results = []
+    violations = []
+    for command, (module, forbidden) in ENTRY_POINTS.items():
+        runs = [import_profile(module) for _ in range(args.repeat)]
+        packages = runs[-1][1]
+        results.append({
+            "command": command,
+            "module": module,
+            "seconds_min": min(elapsed for elapsed, _ in runs),
+            "seconds_median": statistics.median(elapsed for elapsed, _ in runs),
+            "import_ms": {name: packages[name] / 1000 for name in HEAVY if name in packages},
+            "import_total_ms": packages.get(module, 0) / 1000,
+        })
+        violations += [f"{command}: {name}" for name in forbidden if name in packages]
+    write_results(args.output, "startup", vars(args), results)
+
+    if args.check and violations:
+        print("Лишние импорты: " + ", ".join(violations), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Потоковая аналитика (streaming_analytics.StreamingReport) на синтетических
+базах: один проход строками и пакетами Arrow, пиковая память прохода
+(tracemalloc) и точность оценок. Годовые отчеты сверяются с DataBase
+точно, частые языки, процентили времени жизни и число владельцев -
+с точными значениями, посчитанными по всей таблице (--verify).
+
+Запуск из корня проекта:
+    python benchmarks/bench_streaming.py --rows 1000000 10000000 --memory --verify --output streaming.json
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from results import write_results
+from synthetic import make_database
+
+from analytics import Report
+from db_manager import DataBase
+from numpy_analytics import RepoArrays
+from settings import settings
+from streaming_analytics import QUANTILES, SECONDS_PER_DAY, StreamingReport
+
+
+async def check_years(db: DataBase, report: StreamingReport) -> None:
+    expected = Report(await db.get_rollup())
+    pd.testing.assert_frame_equal(expected.count_created_repo(), report.count_created_repo())
+    pd.testing.assert_frame_equal(expected.count_last_push(), report.count_last_push())
+    pd.testing.assert_frame_equal(
+        expected.active_repository_lifespans(), report.active_repository_lifespans()
+    )
+
+
+async def accuracy(db: DataBase, path: str, report: StreamingReport) -> dict:
+    """Относительные ошибки оценок против точных значений по всей таблице."""
+    rollup = await db.get_rollup()
+    languages = rollup[rollup["language"] != ""].groupby("language")["count"].sum()
+    top = report.top_languages(len(languages))
+    language_error = max(abs(top["count"] - languages[top.index]) / languages[top.index])
+
+    arrays = await RepoArrays.from_database(db)
+    lifespans = np.clip(arrays.pushed_at - arrays.created_at, 0, None) / SECONDS_PER_DAY
+    exact = np.quantile(lifespans, QUANTILES)
+    estimated = report.lifespan_percentiles()["days"].to_numpy()
+
+    connection = sqlite3.connect(path)
+    (owners,) = connection.execute(
+        "SELECT COUNT(DISTINCT substr(full_name, 1, instr(full_name, '/') - 1)) FROM repoinfo"
+    ).fetchone()
+    connection.close()
+    return {
+        "top_languages_max_relative_error": float(language_error),
+        "lifespan_quantiles": {
+            str(q): {"exact": float(e), "estimate": float(a), "relative_error": float(a / e - 1)}
+            for q, e, a in zip(QUANTILES, exact, estimated)
+        },
+        "distinct_owners": {
+            "exact": owners,
+            "estimate": report.distinct_owners(),
+            "relative_error": report.distinct_owners() / owners - 1,
+        },
+    }
+
+
+async def run(path: str, chunk_size: int, memory: bool, verify: bool) -> dict:
+    db = DataBase(f"sqlite+aiosqlite:///{path}")
+    await db.init()
+    result = {"seconds": {}}
+    for name, arrow in (("rows", False), ("arrow", True)):
+        started = time.perf_counter()
+        report = await StreamingReport.from_database(db, settings.active_date, chunk_size, arrow)
+        result["seconds"][name] = time.perf_counter() - started
+        await check_years(db, report)
+
+    if memory:
+        tracemalloc.start()
+        await StreamingReport.from_database(db, settings.active_date, chunk_size)
+        result["peak_mib"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    if verify:
+        result["accuracy"] = await accuracy(db, path, report)
+    await db.close()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Потоковая аналитика на синтетических базах")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="строк в одной части")
+    parser.add_argument("--memory", action="store_true", help="пиковая память прохода (tracemalloc)")
+    parser.add_argument("--verify", action="store_true", help="точность оценок (читает всю таблицу)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл JSON с результатами")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            path = os.path.join(directory, f"bench_{rows}.db")
+            make_database(path, rows, args.seed)
+            result = asyncio.run(run(path, args.chunk_size, args.memory, args.verify))
+            results.append({"rows": rows, **result})
+            os.remove(path)
+    write_results(args.output, "streaming", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
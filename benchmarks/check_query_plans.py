@@ -0,0 +1,74 @@
+"""
+Проверяет по EXPLAIN QUERY PLAN, что запросы DataBase к таблице
+репозиториев обслуживаются индексами, а не полным сканированием.
+
+Запуск из корня проекта:
+    python benchmarks/check_query_plans.py
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("PATH_TO_TOKENS", "github_tokens.txt")
+
+from sqlalchemy import event
+
+from db_manager import DataBase, RepoRecord
+
+
+async def capture_statements(db_path: str) -> list[tuple[str, tuple]]:
+    """Выполняет запросы DataBase и возвращает отправленный в SQLite SQL с параметрами."""
+    db = DataBase(f"sqlite+aiosqlite:///{db_path}")
+    await db.init()
+    await db.add_repo_info([
+        RepoRecord(i, f"o/r{i}", "Python", datetime(2015 + i % 10, 1, 1), datetime(2024, 1, 1 + i % 28))
+        for i in range(1000)
+    ])
+    await db.flush()
+
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "INSERT INTO REPOROLLUP")):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine.sync_engine, "before_cursor_execute", before_execute)
+    await db.rebuild_rollup()
+    await db.min_date()
+    await db.max_date()
+    await db.get_active_repository_lifespans()
+    await db.get_language(2020)
+    await db.get_count_last_push()
+    await db.get_count_created_repo()
+    await db.close()
+    return statements
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "plans.db")
+        statements = asyncio.run(capture_statements(db_path))
+
+        connection = sqlite3.connect(db_path)
+        failed = False
+        for statement, parameters in statements:
+            plan = [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            # Полное сканирование RepoInfo без индекса недопустимо
+            full_scan = any(line == "SCAN repoinfo" for line in plan)
+            failed |= full_scan
+            print(("FULL SCAN" if full_scan else "OK") + ": " + " ".join(statement.split())[:120])
+            for line in plan:
+                print(f"    {line}")
+        connection.close()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
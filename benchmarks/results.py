@@ -0,0 +1,43 @@
+"""Запись результатов бенчмарков в JSON для сравнения между версиями."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str | None, benchmark: str, parameters: dict, results: list[dict]) -> None:
+    """
+    Печатает результаты и, если задан path, сохраняет их вместе с версией
+    кода и окружением: файлы разных версий можно сравнивать построчно.
+    """
+    document = {
+        "benchmark": benchmark,
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": parameters,
+        "results": results,
+    }
+    text = json.dumps(document, ensure_ascii=False, indent=2)
+    print(text)
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
@@ -0,0 +1,219 @@
+"""
+Локальная заглушка GitHub /search/repositories для бенчмарков.
+Держит соединения HTTP/1.1 keep-alive и добавляет задержку, имитирующую
+сетевую. Страницы детерминированы: для запросов с окном created:A..B
+(или pushed:A..B) даты создания (последнего push) репозиториев равномерно
+распределены по окну с плотностью density в секунду, для прочих запросов результатов total_count. Лимиты считаются по токенам
+(X-RateLimit-*, 403 при исчерпании), вторичные лимиты выпадают случайно
+с вероятностью secondary_rate (403 с Retry-After), ответы сжимаются gzip
+по Accept-Encoding и поддерживают ETag/If-None-Match.
+
+Отдельный запуск из корня проекта:
+    python benchmarks/stub_server.py --port 8081 --latency 0.05
+"""
+import argparse
+import asyncio
+import functools
+import gzip
+import json
+import random
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+
+
+LANGUAGES = [None, "Python", "JavaScript", "Go", "Rust", "Java", "C++", "TypeScript"]
+WINDOW = re.compile(r"(created|pushed):(\S+?)\.\.(\S+)")
+MAX_RESULTS = 1000 # GitHub отдает не больше 1000 результатов на запрос
+
+
+def parse_window(query: str) -> tuple[str, datetime, datetime] | None:
+    """Поле и окно field:A..B запроса; конец включительный, как у GitHub."""
+    match = WINDOW.search(query)
+    if match is None:
+        return None
+    start, end = (
+        datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        for value in match.groups()[1:]
+    )
+    return match.group(1), start, end + timedelta(seconds=1)
+
+
+def make_page(query: str, page: int, per_page: int, density: float, total_count: int) -> bytes:
+    """Страница ответа поиска с репозиториями, похожими на настоящие."""
+    window = parse_window(query)
+    if window is not None:
+        field, start, end = window
+        total_count = int((end - start).total_seconds() * density)
+    first = (page - 1) * per_page
+    items = []
+    for index in range(first, min(first + per_page, total_count, MAX_RESULTS)):
+        if window is not None and field == "pushed":
+            pushed = start + timedelta(seconds=index / density)
+            created = pushed - timedelta(days=int(pushed.timestamp()) * 7919 % 1500)
+            repo_id = int(created.timestamp() * 10)
+        elif window is not None:
+            created = start + timedelta(seconds=index / density)
+            repo_id = int(created.timestamp() * 10) # уникален при density <= 10
+            pushed = created + timedelta(days=repo_id * 7919 % 1500)
+        else:
+            created = datetime(2020, 1, 1, tzinfo=timezone.utc) + timedelta(hours=index)
+            repo_id = index
+            pushed = created + timedelta(days=repo_id * 7919 % 1500)
+        items.append({
+            "id": repo_id,
+            "full_name": f"owner/repo-{repo_id}",
+            "language": LANGUAGES[repo_id % len(LANGUAGES)],
+            "created_at": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "pushed_at": pushed.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "description": "x" * 200,
+            "owner": {"login": "owner", "type": "User", "site_admin": False},
+        })
+    return json.dumps(
+        {"total_count": total_count, "incomplete_results": False, "items": items}
+    ).encode()
+
+
+class StubServer:
+    """
+    Сервер-заглушка на asyncio. Считает соединения и ответы по кодам,
+    чтобы бенчмарк мог проверить переиспользование соединений и повторы.
+    """
+    def __init__(
+            self,
+            latency: float = 0.05,
+            total_count: int = 1000,
+            density: float = 0.001,
+            rate_limit: int = 1_000_000,
+            secondary_rate: float = 0.0,
+            seed: int = 0,
+    ) -> None:
+        self.__latency = latency
+        self.__total_count = total_count
+        self.__density = density
+        self.__rate_limit = rate_limit # запросов на токен в минуту
+        self.__secondary_rate = secondary_rate
+        self.__random = random.Random(seed)
+        self.__budgets: dict[str, tuple[int, int]] = {} # токен -> (сброс, израсходовано)
+        self.__server: asyncio.Server | None = None
+        self.__body = functools.lru_cache(maxsize=256)(self.__make_body)
+        self.connections = 0
+        self.requests = 0
+        self.statuses: dict[int, int] = {}
+
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "StubServer":
+        self.__server = await asyncio.start_server(self.__handle, host, port)
+        return self
+
+
+    async def close(self) -> None:
+        self.__server.close()
+        await self.__server.wait_closed()
+
+
+    async def __aenter__(self) -> "StubServer":
+        return await self.start()
+
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                self.requests += 1
+                target = request_line.split()[1].decode()
+                await asyncio.sleep(self.__latency)
+                writer.write(self.__response(target, headers))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+    def __spend(self, token: str) -> tuple[int, int]:
+        """Расходует запрос токена; возвращает (остаток, время сброса)."""
+        now = int(time.time())
+        reset_at, used = self.__budgets.get(token, (now + 60, 0))
+        if now >= reset_at:
+            reset_at, used = now + 60, 0
+        used += 1
+        self.__budgets[token] = (reset_at, used)
+        return self.__rate_limit - used, reset_at
+
+
+    def __response(self, target: str, headers: dict[str, str]) -> bytes:
+        remaining, reset_at = self.__spend(headers.get("authorization", ""))
+        head = [
+            f"X-RateLimit-Limit: {self.__rate_limit}",
+            f"X-RateLimit-Remaining: {max(remaining, 0)}",
+            f"X-RateLimit-Reset: {reset_at}",
+            "X-RateLimit-Resource: search",
+        ]
+        if remaining < 0:
+            return self.__message(403, head, b'{"message": "API rate limit exceeded"}')
+        if self.__random.random() < self.__secondary_rate:
+            head.append("Retry-After: 1")
+            return self.__message(403, head, b'{"message": "secondary rate limit"}')
+
+        params = parse_qs(urlsplit(target).query)
+        query = params.get("q", [""])[0]
+        page = int(params.get("page", ["1"])[0])
+        per_page = int(params.get("per_page", ["100"])[0])
+        etag = f'W/"{query}:{page}:{per_page}"'
+        head.append(f"ETag: {etag}")
+        if headers.get("if-none-match") == etag:
+            return self.__message(304, head, b"")
+
+        compress = "gzip" in headers.get("accept-encoding", "")
+        body = self.__body(query, page, per_page, compress)
+        if compress:
+            head.append("Content-Encoding: gzip")
+        head.append("Content-Type: application/json; charset=utf-8")
+        return self.__message(200, head, body)
+
+
+    def __make_body(self, query: str, page: int, per_page: int, compress: bool) -> bytes:
+        body = make_page(query, page, per_page, self.__density, self.__total_count)
+        return gzip.compress(body, compresslevel=1) if compress else body
+
+
+    def __message(self, status: int, head: list[str], body: bytes) -> bytes:
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        reason = {200: "OK", 304: "Not Modified", 403: "Forbidden"}[status]
+        lines = [f"HTTP/1.1 {status} {reason}", *head, f"Content-Length: {len(body)}"]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+async def main(port: int, latency: float) -> None:
+    server = await StubServer(latency).start(port=port)
+    print(f"Заглушка GitHub слушает {server.url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка GitHub /search/repositories")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа, с")
+    args = parser.parse_args()
+    asyncio.run(main(args.port, args.latency))
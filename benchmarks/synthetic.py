@@ -0,0 +1,76 @@
+"""Синтетическая база репозиториев для бенчмарков."""
+import asyncio
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("PATH_TO_TOKENS", "github_tokens.txt")
+
+from db_manager import DataBase
+
+
+LANGUAGES = [None, "Python", "JavaScript", "Go", "Rust", "Java", "C++", "TypeScript", "Ruby", "PHP"]
+START = np.datetime64("2008-01-01T00:00:00", "s").astype(np.int64)
+END = np.datetime64("2026-01-01T00:00:00", "s").astype(np.int64)
+
+
+def make_database(path: str, rows: int, seed: int = 0, chunk: int = 500_000) -> None:
+    """
+    Создает базу со схемой DataBase и rows детерминированных репозиториев,
+    затем пересчитывает RepoRollup.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    url = f"sqlite+aiosqlite:///{path}"
+
+    async def create_schema() -> None:
+        db = DataBase(url)
+        await db.init()
+        await db.close()
+
+    asyncio.run(create_schema())
+
+    rng = np.random.default_rng(seed)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA synchronous=OFF")
+    for first in range(0, rows, chunk):
+        size = min(chunk, rows - first)
+        # Новых репозиториев с каждым годом больше: квадратичное распределение дат создания
+        created = START + ((END - START) * np.sqrt(rng.random(size))).astype(np.int64)
+        pushed = np.minimum(created + rng.exponential(400 * 86400, size).astype(np.int64), END)
+        languages = rng.integers(0, len(LANGUAGES), size)
+        # У владельца в среднем несколько репозиториев: для оценок числа различных владельцев
+        owners = rng.integers(0, max(rows // 4, 1), size)
+        created_text = np.datetime_as_string(created.astype("datetime64[s]"), unit="s")
+        pushed_text = np.datetime_as_string(pushed.astype("datetime64[s]"), unit="s")
+        connection.executemany(
+            "INSERT INTO repoinfo (id, full_name, language, created_at, pushed_at, created_year, pushed_year)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    first + i,
+                    f"owner-{owners[i]}/repo-{first + i}",
+                    LANGUAGES[languages[i]],
+                    created_text[i].replace("T", " ") + ".000000",
+                    pushed_text[i].replace("T", " ") + ".000000",
+                    int(created_text[i][:4]),
+                    int(pushed_text[i][:4]),
+                )
+                for i in range(size)
+            ),
+        )
+        connection.commit()
+    connection.close()
+
+    async def rebuild() -> None:
+        db = DataBase(url)
+        await db.init()
+        await db.rebuild_rollup()
+        await db.close()
+
+    asyncio.run(rebuild())
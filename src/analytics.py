@@ -0,0 +1,63 @@
+import pandas as pd
+
+
+ROLLUP_COLUMNS = ["created_year", "pushed_year", "active", "language", "count"]
+
+
+class Report:
+    """
+    Все отчеты по репозиториям, посчитанные в памяти из одной сгруппированной
+    выборки (created_year, pushed_year, active, language, count).
+    Результаты совпадают с аналитическими методами DataBase.
+    """
+    def __init__(self, rollup: pd.DataFrame) -> None:
+        self.__rollup = rollup
+
+
+    @staticmethod
+    def __by_year(counts: pd.DataFrame, column: str) -> pd.DataFrame:
+        dataframe = (
+            counts.groupby(column, sort=True)["count"].sum()
+            .rename_axis("year")
+            .reset_index()
+        )
+        dataframe["year"] = dataframe["year"].astype(str)
+        dataframe.set_index("year", inplace=True)
+        return dataframe
+
+
+    @property
+    def __active(self) -> pd.DataFrame:
+        return self.__rollup[self.__rollup["active"].astype(bool)]
+
+
+    def created_years(self) -> list[int]:
+        """Годы создания активных репозиториев с известным языком, от новых к старым."""
+        active = self.__active
+        years = active.loc[active["language"] != "", "created_year"].unique()
+        return sorted((int(year) for year in years), reverse=True)
+
+
+    def active_repository_lifespans(self) -> pd.DataFrame:
+        """Сколько активных репозиториев создано в каждом году."""
+        return self.__by_year(self.__active, "created_year")
+
+
+    def language(self, year_created: int) -> pd.DataFrame:
+        """
+        Языки активных репозиториев, созданных в заданном году.
+        :return: DataFrame со столбцами: language, count
+        """
+        active = self.__active
+        counts = active[(active["created_year"] == year_created) & (active["language"] != "")]
+        return counts.groupby("language", sort=False)[["count"]].sum()
+
+
+    def count_last_push(self) -> pd.DataFrame:
+        """Сколько репозиториев сделали свой последний коммит в каждом году."""
+        return self.__by_year(self.__rollup, "pushed_year")
+
+
+    def count_created_repo(self) -> pd.DataFrame:
+        """Сколько репозиториев было создано в каждом году."""
+        return self.__by_year(self.__rollup, "created_year")
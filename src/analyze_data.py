@@ -1,26 +1,27 @@
-import asyncio
-from datetime import datetime
+import sys
+from typing import TYPE_CHECKING
 
 import pandas as pd
-from dateutil.relativedelta import relativedelta
 
+from analytics import Report
 from db_manager import DataBase
-from picture_generator import PictureGenerator
+from picture_generator import ChartJob, PictureGenerator
 from settings import settings
 
+if TYPE_CHECKING:
+    from streaming_analytics import StreamingReport
 
-async def plot_hist(
-        db: DataBase,
-        max_date: datetime,
+
+def plot_hist(
         title: str,
         x_title: str,
         y_title: str,
         age_distribution: pd.DataFrame,
-) -> None:
+) -> ChartJob:
     """
-    Строит гистограммы распределения репозиториев по возрасту (в годах).
+    Готовит гистограмму распределения репозиториев по возрасту (в годах).
     """
-    PictureGenerator.generate_histogram_picture(
+    return PictureGenerator.histogram_job(
         age_distribution["count"],
         title,
         x_title,
@@ -28,63 +29,144 @@ async def plot_hist(
     )
 
 
-async def plot_pie(
-        db: DataBase
-) -> None:
+def plot_pie(
+        report: Report
+) -> list[ChartJob]:
     """
-    Строит круговые диаграммы распределения
-    языков для репозиториев конкретного возраста
+    Готовит круговые диаграммы распределения
+    языков для репозиториев каждого года создания
     """
-    for age in [2025, 2024, 2023, 2022, 2021, 2020, 2018, 2016, 2012, 2010]:
-        counts_languages = await db.get_language(age)
+    jobs = []
+    for age in report.created_years():
+        counts_languages = report.language(age)
         counts_languages_top_10 = counts_languages.nlargest(10, "count")
 
-        PictureGenerator.generate_pie_picture(
+        jobs.append(PictureGenerator.pie_job(
             counts_languages_top_10["count"], f"Языки в активных репозиториях c {age} года"
-        )
+        ))
+    return jobs
 
 
-async def plot_lines(
-        db: DataBase,
-        max_date: datetime,
+def plot_pie_matrix(matrix: pd.DataFrame) -> list[ChartJob]:
+    """
+    Те же круговые диаграммы, что plot_pie, по матрице языков и годов
+    создания активных репозиториев (NumpyAnalytics.language_year_matrix)
+    """
+    jobs = []
+    for age in sorted(matrix.columns, reverse=True):
+        counts_languages = matrix[age][matrix[age] > 0]
+        if counts_languages.empty:
+            continue
+        jobs.append(PictureGenerator.pie_job(
+            counts_languages.nlargest(10).rename("count"),
+            f"Языки в активных репозиториях c {age} года",
+        ))
+    return jobs
+
+
+def plot_lines(
         counts_last_year: pd.DataFrame,
 ) -> None:
     """Строит линейный график"""
     pass
 
 
-async def main() -> None:
-    db = DataBase(settings.db_url)
-    age_distribution = await db.get_active_repository_lifespans()
-    max_date = await db.max_date()
-    push_distribution = await db.get_count_last_push()
-    create_distribution = await db.get_count_created_repo()
-    await plot_hist(
-        db,
-        max_date,
-        "Распределение репозиториев по возрасту",
-        "Года создания",
-        "Количество репозиториев",
-        age_distribution,
-    )
-    await plot_pie(db)
-    await plot_hist(
-        db,
-        max_date,
-        "Последние коммиты репозиториев по годам",
-        "Года",
-        "Количество репозиториев",
-        push_distribution,
-    )
-    await plot_hist(
-        db,
-        max_date,
-        "Количество созданных репозиториев в каждый год",
-        "Года",
-        "Количество репозиториев",
-        create_distribution
-    )
+def print_summary(report: "StreamingReport") -> None:
+    """Печатает отчеты потоковой аналитики, которых нет среди графиков."""
+    print(f"Репозиториев: {report.rows}, различных владельцев: ~{report.distinct_owners()}")
+    print("Частые языки (count завышен не больше чем на error):")
+    print(report.top_languages().to_string())
+    print("Время жизни репозитория от создания до последнего коммита, дней:")
+    print(report.lifespan_percentiles().round(1).to_string())
+
+
+async def summary(parquet: str | None = None) -> None:
+    """Один проход по сырым строкам базы или выгрузки с постоянной памятью."""
+    from streaming_analytics import StreamingReport # скетчи нужны только для --summary
+
+    if parquet is not None:
+        report = StreamingReport.from_parquet(parquet, settings.active_date)
+    else:
+        db = DataBase(settings.db_url)
+        await db.init()
+        report = await StreamingReport.from_database(db, settings.active_date)
+        await db.close()
+    print_summary(report)
+
+
+async def main(
+        rebuild_rollup: bool = False,
+        force: bool = False,
+        parquet: str | None = None,
+        engine: str = "arrow",
+) -> None:
+    numpy_analytics = None
+    if engine == "numpy":
+        from numpy_analytics import NumpyAnalytics, RepoArrays # numpy нужен только здесь
+
+        if parquet is not None:
+            arrays = RepoArrays.from_parquet(parquet)
+        else:
+            db = DataBase(settings.db_url)
+            await db.init()
+            arrays = await RepoArrays.from_database(db)
+            await db.close()
+        numpy_analytics = NumpyAnalytics(arrays, settings.active_date)
+        report = Report(numpy_analytics.get_rollup())
+    elif parquet is not None and engine == "duckdb":
+        from duckdb_analytics import DuckDbAnalytics # duckdb нужен только здесь
+
+        analytics = DuckDbAnalytics(parquet, settings.active_date)
+        report = Report(analytics.get_rollup())
+        analytics.close()
+    elif parquet is not None:
+        from export_data import read_parquet_rollup # pyarrow нужен только здесь
+
+        report = Report(read_parquet_rollup(parquet, settings.active_date))
+    else:
+        db = DataBase(settings.db_url)
+        await db.init()
+        if rebuild_rollup:
+            await db.rebuild_rollup()
+        # Единственный запрос к базе: все отчеты считаются из него в памяти
+        report = Report(await db.get_rollup())
+        await db.close()
+
+    jobs = [
+        plot_hist(
+            "Распределение репозиториев по возрасту",
+            "Года создания",
+            "Количество репозиториев",
+            report.active_repository_lifespans(),
+        ),
+        *(
+            plot_pie(report) if numpy_analytics is None
+            else plot_pie_matrix(numpy_analytics.language_year_matrix())
+        ),
+        plot_hist(
+            "Последние коммиты репозиториев по годам",
+            "Года",
+            "Количество репозиториев",
+            report.count_last_push(),
+        ),
+        plot_hist(
+            "Количество созданных репозиториев в каждый год",
+            "Года",
+            "Количество репозиториев",
+            report.count_created_repo(),
+        ),
+    ]
+    if numpy_analytics is not None:
+        jobs.append(plot_hist(
+            "Время жизни репозиториев",
+            "Полных лет от создания до последнего коммита",
+            "Количество репозиториев",
+            numpy_analytics.lifespan_histogram(),
+        ))
+    PictureGenerator.render_all(jobs, force)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    from cli import run # аргументы всех команд описаны в cli.py
+
+    run(["analyze", *sys.argv[1:]])
@@ -0,0 +1,148 @@
+"""
+Единая точка входа: python cli.py {save|analyze|export} [параметры].
+
+Здесь только разбор аргументов. Модуль команды (а с ним SQLAlchemy,
+pandas, настройки из .env) импортируется после разбора и только для
+выбранной команды, поэтому --help и короткие запуски по расписанию
+не тратят время на импорт того, что им не нужно.
+"""
+import argparse
+import asyncio
+import os
+from typing import Optional, Sequence
+
+
+def save(args: argparse.Namespace) -> None:
+    import save_data
+
+    if args.shards is not None or args.worker or args.merge:
+        asyncio.run(
+            save_data.main_sharded(
+                args.shards, args.processes, args.worker, args.token_slot, args.token_slots
+            )
+        )
+    else:
+        asyncio.run(
+            save_data.main(args.since_last_run, args.replay_failed, args.profile, args.refresh)
+        )
+
+
+def analyze(args: argparse.Namespace) -> None:
+    import analyze_data
+
+    if args.summary:
+        asyncio.run(analyze_data.summary(args.parquet))
+    else:
+        asyncio.run(analyze_data.main(args.rebuild_rollup, args.force, args.parquet, args.engine))
+
+
+def export(args: argparse.Namespace) -> None:
+    import export_data
+
+    asyncio.run(export_data.main(args.output, args.chunk_size))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Сбор и анализ репозиториев GitHub")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="{save|analyze|export}")
+
+    parser_save = commands.add_parser("save", help="сбор репозиториев с GitHub API")
+    parser_save.set_defaults(handler=save)
+    parser_save.add_argument(
+        "--since-last-run",
+        action="store_true",
+        help="загрузить только окна новее последнего завершенного обхода",
+    )
+    parser_save.add_argument(
+        "--replay-failed",
+        action="store_true",
+        help="повторить только страницы, которые не удалось загрузить",
+    )
+    parser_save.add_argument(
+        "--refresh",
+        action="store_true",
+        help="обновить только репозитории, в которые был push после прошлого обновления",
+    )
+    parser_save.add_argument(
+        "--profile",
+        choices=["cprofile", "pyinstrument"],
+        help="профилировать обход (pyinstrument устанавливается отдельно)",
+    )
+    sharding = parser_save.add_mutually_exclusive_group()
+    sharding.add_argument(
+        "--shards",
+        type=int,
+        help="распределенный обход: разделить промежуток не меньше чем на столько шардов "
+        "по началам лет, месяцев, дней",
+    )
+    sharding.add_argument(
+        "--worker",
+        action="store_true",
+        help="только воркер распределенного обхода (например, на другой машине)",
+    )
+    sharding.add_argument(
+        "--merge",
+        action="store_true",
+        help="только перенести обойденные шарды в основную базу",
+    )
+    parser_save.add_argument(
+        "--processes",
+        type=int,
+        default=os.cpu_count(),
+        help="процессов-воркеров координатора (не больше числа токенов)",
+    )
+    parser_save.add_argument("--token-slot", type=int, default=0, help="номер воркера --worker")
+    parser_save.add_argument(
+        "--token-slots",
+        type=int,
+        default=1,
+        help="число воркеров, делящих файл токенов: воркеру достается каждый N-й токен",
+    )
+
+    parser_analyze = commands.add_parser("analyze", help="построение графиков по собранным репозиториям")
+    parser_analyze.set_defaults(handler=analyze)
+    parser_analyze.add_argument(
+        "--rebuild-rollup",
+        action="store_true",
+        help="пересчитать предагрегированные счетчики по всей таблице репозиториев",
+    )
+    parser_analyze.add_argument(
+        "--force",
+        action="store_true",
+        help="перерисовать все графики, даже если данные не изменились",
+    )
+    parser_analyze.add_argument(
+        "--parquet",
+        metavar="DIR",
+        help="строить отчеты по выгрузке в Parquet (export), а не по базе",
+    )
+    parser_analyze.add_argument(
+        "--engine",
+        choices=["arrow", "duckdb", "numpy"],
+        default="arrow",
+        help="чем считать отчеты по выгрузке --parquet: pyarrow или DuckDB; numpy - по базе "
+             "или выгрузке, с гистограммой времени жизни репозиториев",
+    )
+    parser_analyze.add_argument(
+        "--summary",
+        action="store_true",
+        help="вместо графиков напечатать частые языки, процентили времени жизни и число "
+             "владельцев: один проход по всем строкам с постоянной памятью",
+    )
+
+    parser_export = commands.add_parser("export", help="выгрузка репозиториев в Parquet")
+    parser_export.set_defaults(handler=export)
+    parser_export.add_argument("--output", default="export", help="каталог набора данных Parquet")
+    parser_export.add_argument(
+        "--chunk-size", type=int, default=50_000, help="строк в одной части чтения"
+    )
+    return parser
+
+
+def run(argv: Optional[Sequence[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    run()
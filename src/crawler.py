@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterable
+
+from etag_cache import ETagCache
+from fetcher import (
+    ApiRateException, ApiSecondaryRateException, ApiTransientException, Fetcher, SearchResult,
+)
+from metrics import BREAKER_OPEN, PAGES, QUEUE_DEPTH, RETRIES, TOKEN_REMAINING, registry
+from planner import WorkUnit
+from retry import CircuitBreaker, RetryPolicy
+from token_provider import SEARCH, NoTokenAvailable, Token, TokenProvider
+
+
+# Обработчик загруженной страницы: сохраняет данные, может добавить новые единицы работы
+Handler = Callable[[WorkUnit, SearchResult], Awaitable[None]]
+# Обработчик страницы, которую не удалось загрузить или сохранить: (страница, ошибка, попыток)
+FailureHandler = Callable[[WorkUnit, Exception, int], Awaitable[None]]
+
+# GitHub советует ждать после вторичного лимита без Retry-After не меньше минуты
+SECONDARY_RATE_DELAY = 60.0
+
+
+class CrawlEngine:
+    """
+    Обходит очередь единиц работы пулом воркеров.
+
+    На каждый токен запускается workers_per_token воркеров с общим Fetcher
+    этого токена: запросы воркеров идут через один пул соединений (или одно
+    соединение HTTP/2) размером HTTP_MAX_CONNECTIONS. Исчерпав лимит,
+    воркер ждет сброса только своего токена, остальные продолжают работу.
+    Общее число одновременных запросов к API ограничено семафором.
+
+    Временные сбои повторяются с экспоненциальной задержкой по retry_policy,
+    серия сбоев размыкает общий breaker и приостанавливает всех воркеров.
+    Отказы по лимитам (403/429) ждут сброса или паузы токена, но не больше
+    max_attempts раз подряд на одну страницу.
+    Страница, которую не удалось обработать, передается в failure_handler.
+    С etag_cache фетчеры делают условные запросы по ETag прошлых обходов.
+    """
+    def __init__(
+            self,
+            token_provider: TokenProvider,
+            handler: Handler,
+            workers_per_token: int,
+            max_concurrency: int,
+            per_page: int = 100,
+            failure_handler: FailureHandler | None = None,
+            retry_policy: RetryPolicy | None = None,
+            breaker: CircuitBreaker | None = None,
+            etag_cache: ETagCache | None = None,
+    ) -> None:
+        self.__token_provider = token_provider
+        self.__handler = handler
+        self.__failure_handler = failure_handler
+        self.__retry_policy = retry_policy or RetryPolicy()
+        self.__breaker = breaker or CircuitBreaker()
+        self.__etag_cache = etag_cache
+        self.__workers_per_token = workers_per_token
+        self.__semaphore = asyncio.Semaphore(max_concurrency)
+        self.__per_page = per_page
+        self.__queue: asyncio.Queue[WorkUnit] = asyncio.Queue()
+
+
+    @property
+    def per_page(self) -> int:
+        return self.__per_page
+
+
+    def put(self, unit: WorkUnit) -> None:
+        """Добавляет единицу работы в очередь. Можно вызывать из обработчика."""
+        self.__queue.put_nowait(unit)
+
+
+    async def run(self, units: Iterable[WorkUnit]) -> None:
+        """Обрабатывает все единицы работы, включая добавленные по ходу обхода."""
+        for unit in units:
+            self.put(unit)
+
+        if not self.__token_provider.tokens:
+            raise NoTokenAvailable
+
+        registry.add_collector(self.__collect_metrics)
+        stack = AsyncExitStack()
+        stack.callback(registry.remove_collector, self.__collect_metrics)
+        async with stack:
+            fetchers = [
+                await stack.enter_async_context(
+                    Fetcher(token, self.__per_page, etag_cache=self.__etag_cache)
+                )
+                for token in self.__token_provider.tokens
+            ]
+            workers = [
+                asyncio.create_task(self.__worker(fetcher))
+                for fetcher in fetchers
+                for _ in range(self.__workers_per_token)
+            ]
+            try:
+                await self.__queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+
+    def __collect_metrics(self) -> None:
+        QUEUE_DEPTH.set(self.__queue.qsize(), "crawl")
+        BREAKER_OPEN.set(int(self.__breaker.is_open))
+        for token in self.__token_provider.tokens:
+            TOKEN_REMAINING.set(token.remaining(SEARCH), token.name)
+
+
+    async def __worker(self, fetcher: Fetcher) -> None:
+        while True:
+            unit = await self.__queue.get()
+            try:
+                await self.__process(fetcher, unit)
+            except Exception as e:
+                logging.error(f"Ошибка воркера на странице {unit.page} запроса {unit.query}, {e}")
+            finally:
+                self.__queue.task_done()
+
+
+    async def __process(self, fetcher: Fetcher, unit: WorkUnit) -> None:
+        token: Token = fetcher.token
+        attempt = 0 # неудачные попытки из-за сбоев API
+        throttled = 0 # отказы по лимитам подряд: после max_attempts страница считается неудачной
+        while True:
+            await self.__breaker.wait()
+            await self.__token_provider.acquire(token)
+            try:
+                async with self.__semaphore:
+                    result = await fetcher.fetch_repos_page(unit.page, unit.query)
+
+            except ApiRateException as e:
+                RETRIES.inc("primary_rate_limit")
+                throttled += 1
+                if throttled >= self.__retry_policy.max_attempts:
+                    await self.__fail(unit, e, throttled)
+                    return
+                logging.warning(
+                    f"Достигнут лимит запросов на странице {unit.page}. Ожидание сброса токена"
+                )
+                continue
+
+            except ApiSecondaryRateException as e:
+                # Токен не меняем: замедляются только воркеры этого токена
+                RETRIES.inc("secondary_rate_limit")
+                throttled += 1
+                if throttled >= self.__retry_policy.max_attempts:
+                    await self.__fail(unit, e, throttled)
+                    return
+                delay = self.__retry_policy.delay(throttled, e.retry_after, SECONDARY_RATE_DELAY)
+                logging.warning(
+                    f"Вторичный лимит на странице {unit.page}, пауза токена на {delay:.0f} с"
+                )
+                token.pause(SEARCH, datetime.now() + timedelta(seconds=delay))
+                continue
+
+            except ApiTransientException as e:
+                RETRIES.inc("transient")
+                attempt += 1
+                self.__breaker.record_failure()
+                if attempt >= self.__retry_policy.max_attempts:
+                    await self.__fail(unit, e, attempt)
+                    return
+                delay = self.__retry_policy.delay(attempt, e.retry_after)
+                logging.warning(
+                    f"Сбой на странице {unit.page} запроса {unit.query} ({e}), "
+                    f"попытка {attempt}, повтор через {delay:.1f} с"
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            except Exception as e: # ApiPermanentException и прочие: повтор не поможет
+                await self.__fail(unit, e, attempt + 1)
+                return
+
+            self.__breaker.record_success()
+            try:
+                await self.__handler(unit, result)
+            except Exception as e:
+                await self.__fail(unit, e, attempt + 1)
+            return
+
+
+    async def __fail(self, unit: WorkUnit, error: Exception, attempts: int) -> None:
+        PAGES.inc("failed")
+        logging.error(
+            f"Страница {unit.page} запроса {unit.query} не обработана "
+            f"за {attempts} попыток, {error!r}"
+        )
+        if self.__failure_handler is not None:
+            await self.__failure_handler(unit, error, attempts)
@@ -1,46 +1,805 @@
-import pandas as pd
-from datetime import datetime
-from typing import Optional
+import asyncio
+import hashlib
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, AsyncIterator, NamedTuple, Optional, Sequence
 
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy import (
+    BigInteger, Connection, Index, Integer, Row, String, bindparam, cast, delete, extract, insert,
+    inspect, update,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, create_async_engine, async_sessionmaker
 from sqlmodel import Field, SQLModel, select, func
 
+from dialects import get_dialect
+from metrics import DB_FLUSH_SECONDS, DB_ROWS
+from planner import CREATED
+from query_cache import QueryCache, cached_query
 from settings import settings
 
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
 
 ACTIVE_AFTER = settings.active_date
 
 
 class RepoInfo(SQLModel, table=True):
+    __table_args__ = (
+        # Покрывающий индекс для пересчета RepoRollup: группировка без чтения таблицы
+        Index("ix_repoinfo_years_language", "created_year", "pushed_year", "language", "pushed_at"),
+    )
+
     id: int = Field(primary_key=True)
     full_name: str = Field
     language: Optional[str] = Field(index=True)
+    created_at: datetime = Field(index=True)
+    pushed_at: datetime
+    created_year: Optional[int] = None # год created_at, хранится для индексов
+    pushed_year: Optional[int] = None # год pushed_at, хранится для индексов
+
+
+class RepoRecord(NamedTuple):
+    """Строка RepoInfo для пакетной вставки, без накладных расходов ORM-модели."""
+    id: int
+    full_name: str
+    language: Optional[str]
     created_at: datetime
     pushed_at: datetime
 
 
+class RepoRollup(SQLModel, table=True):
+    """
+    Предагрегированные счетчики репозиториев для аналитики.
+    Поддерживаются в той же транзакции, что и запись репозиториев.
+    """
+    created_year: int = Field(primary_key=True)
+    pushed_year: int = Field(primary_key=True)
+    active: bool = Field(primary_key=True) # pushed_at > ACTIVE_AFTER
+    language: str = Field(primary_key=True) # "" для репозиториев без языка
+    count: int
+
+
+class DbMeta(SQLModel, table=True):
+    """Служебные значения базы данных (ключ - значение)."""
+    key: str = Field(primary_key=True)
+    value: str
+
+
+ROLLUP_ACTIVE_AFTER = "rollup_active_after" # для какой active_after посчитаны счетчики
+GENERATION = "generation" # версия данных: растет при каждой записи репозиториев
+REFRESH_WATERMARK = "refresh_watermark" # с какого момента искать push при обновлении активности
+DATABASE_ID = "database_id" # случайный id базы, создается вместе с ней: отличает пересозданную базу
+
+# SQLite ограничивает число параметров в одном запросе
+SELECT_CHUNK = 500
+
+
+# Статусы единиц работы краулера в журнале обхода
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+# Дополнительные статусы шардов распределенного обхода
+LEASED = "leased"
+MERGED = "merged"
+
+
+class CrawlUnit(SQLModel, table=True):
+    """
+    Журнал обхода: одна страница поиска по одному временному окну.
+    Страницы со статусом failed - очередь недоставленных: они не повторяются
+    автоматически и догружаются запуском с --replay-failed.
+    """
+    query: str = Field(primary_key=True)
+    page: int = Field(primary_key=True)
+    window_start: datetime
+    window_end: datetime = Field(index=True)
+    field: str = CREATED # поле даты окна: created (обход) или pushed (обновление)
+    status: str = Field(default=PENDING, index=True)
+    total_count: Optional[int] = None
+    fetched_at: Optional[datetime] = None
+    attempts: Optional[int] = None # сколько попыток потрачено на неудачную страницу
+    error: Optional[str] = None # последняя ошибка неудачной страницы
+
+
+class CrawlShard(SQLModel, table=True):
+    """
+    Шард распределенного обхода: промежуток дат создания, который один воркер
+    обходит целиком в свою промежуточную базу. Воркер берет шард в аренду
+    до lease_until (UTC по часам базы) и продлевает ее, пока работает; шард с истекшей арендой
+    забирает другой воркер. Обойденные шарды (done) переносятся в основную
+    базу и получают статус merged.
+    """
+    id: int = Field(primary_key=True)
+    window_start: datetime
+    window_end: datetime
+    status: str = Field(default=PENDING, index=True)
+    worker: Optional[str] = None # кто держит или держал аренду
+    lease_until: Optional[datetime] = None
+    leases: int = 0 # сколько раз шард выдавался в аренду, версия строки
+    error: Optional[str] = None
+
+
+class PageETag(SQLModel, table=True):
+    """ETag последнего полного ответа на страницу поиска для условных запросов."""
+    query: str = Field(primary_key=True)
+    page: int = Field(primary_key=True)
+    etag: str
+    total_count: int # из полного ответа: при 304 тела нет, а планировщику он нужен
+
+
+def epoch(column):
+    """Выражение: дата столбца в секундах от эпохи (UTC), вычисляется в базе."""
+    return cast(extract("epoch", column), BigInteger)
+
+
+def year(column):
+    """Выражение: год даты столбца (strftime в SQLite, EXTRACT в PostgreSQL)."""
+    return cast(extract("year", column), Integer)
+
+
+def frame(rows: Sequence, columns: list[str]) -> "pd.DataFrame":
+    """
+    DataFrame из строк результата запроса. pandas импортируется при первом
+    отчете: сбор и обновление данных запускаются без него.
+    """
+    import pandas as pd
+    return pd.DataFrame(rows, columns=columns)
+
+
 class DataBase:
-    def __init__(self, db_url: str):
+    def __init__(self, db_url: str, batch_size: int = settings.db_batch_size):
+        self.__db_url = db_url
         self.engine = create_async_engine(db_url, echo=False)
         self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.query_cache = QueryCache(settings.query_cache_size, settings.query_cache_dir)
+        self.__batch_size = batch_size
+        self.__repo_rows: list[dict] = [] # накопленные, но еще не записанные репозитории
+        self.__new_unit_rows: list[dict] = [] # новые единицы работы краулера
+        self.__unit_rows: list[dict] = [] # накопленные результаты единиц работы краулера
+        self.__etag_rows: list[dict] = [] # ETag загруженных страниц
+        self.__connection: AsyncConnection | None = None
+        self.__flush_lock = asyncio.Lock()
+
+        # Upsert, загрузка пакетов и настройки соединений под конкретный движок
+        self.dialect = get_dialect(self.engine)
 
 
     async def init(self) -> None:
-        """Создает в базе данных таблицу"""
+        """
+        Создает в базе данных таблицы, переводит существующие на текущую
+        схему, при необходимости пересчитывает RepoRollup и открывает
+        соединение для пакетной записи
+        """
         async with self.engine.begin() as conn:
             await conn.run_sync(SQLModel.metadata.create_all)
+            await conn.run_sync(self.__migrate)
+            await conn.execute(
+                self.dialect.insert(DbMeta)
+                .values(key=DATABASE_ID, value=uuid.uuid4().hex)
+                .on_conflict_do_nothing(index_elements=[DbMeta.key])
+            )
+        database_id = await self.get_meta(DATABASE_ID)
+        # Файлы кеша запросов на диске принадлежат этой базе по этому адресу
+        self.query_cache.namespace = hashlib.sha256(
+            f"{self.__db_url}\n{database_id}".encode()
+        ).hexdigest()[:16]
+        await self.__ensure_rollup()
+        self.__connection = await self.engine.connect()
+
+
+    @staticmethod
+    def __migrate(conn: Connection) -> None:
+        """
+        Добавляет в таблицы, созданные прошлыми версиями, недостающие
+        столбцы и индексы и заполняет новые столбцы по существующим данным.
+        """
+        inspector = inspect(conn)
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                logging.info(f"Миграция: добавление столбца {table.name}.{column.name}")
+                column_type = column.type.compile(conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+        conn.execute(
+            update(RepoInfo)
+            .where(RepoInfo.created_year.is_(None))
+            .values(
+                created_year=year(RepoInfo.created_at),
+                pushed_year=year(RepoInfo.pushed_at),
+            )
+        )
+        conn.execute(update(CrawlUnit).where(CrawlUnit.field.is_(None)).values(field=CREATED))
+
+
+    async def close(self) -> None:
+        """
+        Записывает накопленные данные, переносит WAL в основной файл
+        базы (с fsync) и закрывает соединения
+        """
+        await self.flush()
+        if self.__connection is not None:
+            await self.dialect.checkpoint(self.__connection)
+            await self.__connection.close()
+            self.__connection = None
+        await self.engine.dispose()
 
 
     async def add_repo_info(
             self,
-            infos: list[RepoInfo],
+            infos: list[RepoRecord],
+    ) -> None:
+        """
+        Накапливает записи о репозиториях и записывает их в таблицу
+        пакетами по batch_size строк
+        """
+        for info in infos:
+            row = info._asdict()
+            row["created_year"] = info.created_at.year
+            row["pushed_year"] = info.pushed_at.year
+            self.__repo_rows.append(row)
+        if len(self.__repo_rows) >= self.__batch_size:
+            await self.flush()
+
+
+    async def flush(self) -> None:
+        """
+        Записывает накопленные репозитории и результаты единиц работы
+        одной транзакцией. Уже сохраненные репозитории обновляются (upsert по id).
+        """
+        async with self.__flush_lock:
+            repo_rows, self.__repo_rows = self.__repo_rows, []
+            new_unit_rows, self.__new_unit_rows = self.__new_unit_rows, []
+            unit_rows, self.__unit_rows = self.__unit_rows, []
+            etag_rows, self.__etag_rows = self.__etag_rows, []
+            if not repo_rows and not new_unit_rows and not unit_rows and not etag_rows:
+                return
+
+            if self.__connection is None:
+                self.__connection = await self.engine.connect()
+            with DB_FLUSH_SECONDS.time():
+                await self.__write(repo_rows, new_unit_rows, unit_rows, etag_rows)
+            DB_ROWS.inc("repoinfo", amount=len(repo_rows))
+            DB_ROWS.inc("crawlunit", amount=len(new_unit_rows) + len(unit_rows))
+            DB_ROWS.inc("pageetag", amount=len(etag_rows))
+
+
+    async def __write(
+            self,
+            repo_rows: list[dict],
+            new_unit_rows: list[dict],
+            unit_rows: list[dict],
+            etag_rows: list[dict],
+    ) -> None:
+        """Одна транзакция записи накопленных строк."""
+        async with self.__connection.begin():
+            if new_unit_rows:
+                await self.dialect.upsert(
+                    self.__connection, CrawlUnit, new_unit_rows, [CrawlUnit.query, CrawlUnit.page]
+                )
+            if repo_rows:
+                await self.__upsert_repos(self.__connection, repo_rows)
+                await self.__connection.execute(self.__next_generation())
+            if unit_rows:
+                table = CrawlUnit.__table__
+                query = (
+                    update(table)
+                    .where(table.c.query == bindparam("b_query"))
+                    .where(table.c.page == bindparam("b_page"))
+                )
+                await self.__connection.execute(query, unit_rows)
+            if etag_rows:
+                await self.dialect.upsert(
+                    self.__connection,
+                    PageETag,
+                    etag_rows,
+                    [PageETag.query, PageETag.page],
+                    lambda excluded: {"etag": excluded.etag, "total_count": excluded.total_count},
+                )
+
+
+    def __next_generation(self):
+        """Запрос, увеличивающий версию данных на единицу."""
+        query = self.dialect.insert(DbMeta).values(key=GENERATION, value="1")
+        return query.on_conflict_do_update(
+            index_elements=[DbMeta.key],
+            set_={"value": cast(cast(DbMeta.value, Integer) + 1, String)},
+        )
+
+
+    async def get_meta(self, key: str) -> Optional[str]:
+        """Служебное значение из DbMeta или None."""
+        async with self.session() as session:
+            async with session.begin():
+                meta = await session.get(DbMeta, key, populate_existing=True)
+                return meta.value if meta is not None else None
+
+
+    async def set_meta(self, key: str, value: str) -> None:
+        """Записывает служебное значение в DbMeta."""
+        async with self.session() as session:
+            async with session.begin():
+                await session.merge(DbMeta(key=key, value=value))
+
+
+    async def data_version(self, session: Optional[AsyncSession] = None) -> int:
+        """
+        Текущая версия данных для ключей кеша запросов.
+        :param session: Прочитать в транзакции этой сессии, а не в отдельной
+        """
+        if session is None:
+            async with self.session() as session:
+                async with session.begin():
+                    return await self.data_version(session)
+        meta = await session.get(DbMeta, GENERATION, populate_existing=True)
+        return int(meta.value) if meta is not None else 0
+
+
+    def invalidate_cache(self) -> None:
+        """Сбрасывает кеш результатов аналитических запросов"""
+        self.query_cache.invalidate()
+
+
+    @staticmethod
+    def __rollup_key(created_at: datetime, pushed_at: datetime, language: Optional[str]) -> tuple:
+        return created_at.year, pushed_at.year, pushed_at > ACTIVE_AFTER, language or ""
+
+
+    async def __upsert_repos(self, conn: AsyncConnection, repo_rows: list[dict]) -> None:
+        """
+        Вставляет или обновляет репозитории и поправляет счетчики RepoRollup:
+        старое состояние обновляемых репозиториев вычитается, новое прибавляется.
+        """
+        repo_rows = list({row["id"]: row for row in repo_rows}.values()) # последняя версия id
+        delta = Counter()
+
+        ids = [row["id"] for row in repo_rows]
+        for i in range(0, len(ids), SELECT_CHUNK):
+            query = (
+                select(RepoInfo.created_at, RepoInfo.pushed_at, RepoInfo.language)
+                .where(RepoInfo.id.in_(ids[i:i + SELECT_CHUNK]))
+            )
+            for created_at, pushed_at, language in await conn.execute(query):
+                delta[self.__rollup_key(created_at, pushed_at, language)] -= 1
+        for row in repo_rows:
+            delta[self.__rollup_key(row["created_at"], row["pushed_at"], row["language"])] += 1
+
+        await self.dialect.upsert(
+            conn,
+            RepoInfo,
+            repo_rows,
+            [RepoInfo.id],
+            lambda excluded: {
+                "pushed_at": excluded.pushed_at,
+                "pushed_year": excluded.pushed_year,
+                "language": excluded.language,
+            },
+        )
+
+        rollup_rows = [
+            {
+                "created_year": created_year,
+                "pushed_year": pushed_year,
+                "active": active,
+                "language": language,
+                "count": count,
+            }
+            for (created_year, pushed_year, active, language), count in delta.items()
+            if count != 0
+        ]
+        if rollup_rows:
+            await self.dialect.upsert(
+                conn,
+                RepoRollup,
+                rollup_rows,
+                [
+                    RepoRollup.created_year,
+                    RepoRollup.pushed_year,
+                    RepoRollup.active,
+                    RepoRollup.language,
+                ],
+                lambda excluded: {"count": RepoRollup.count + excluded.count},
+            )
+            await conn.execute(delete(RepoRollup).where(RepoRollup.count <= 0))
+
+
+    async def rebuild_rollup(self) -> None:
+        """Пересчитывает RepoRollup по всей таблице репозиториев"""
+        async with self.session() as session:
+            async with session.begin():
+                await session.execute(delete(RepoRollup))
+                active = RepoInfo.pushed_at > ACTIVE_AFTER
+                language = func.coalesce(RepoInfo.language, "")
+                query = (
+                    select(RepoInfo.created_year, RepoInfo.pushed_year, active, language, func.count())
+                    # Группировка по тому же выражению, что и выборка: NULL и "" - один ключ RepoRollup
+                    .group_by(RepoInfo.created_year, RepoInfo.pushed_year, language, active)
+                )
+                await session.execute(
+                    insert(RepoRollup).from_select(
+                        ["created_year", "pushed_year", "active", "language", "count"], query
+                    )
+                )
+                await session.merge(DbMeta(key=ROLLUP_ACTIVE_AFTER, value=settings.active_after))
+                await session.execute(self.__next_generation())
+
+
+    async def __ensure_rollup(self) -> None:
+        """Пересчитывает RepoRollup, если он посчитан для другой даты active_after"""
+        async with self.session() as session:
+            async with session.begin():
+                meta = await session.get(DbMeta, ROLLUP_ACTIVE_AFTER)
+        if meta is None or meta.value != settings.active_after:
+            logging.info("Пересчет предагрегированных счетчиков RepoRollup")
+            await self.rebuild_rollup()
+
+
+    async def add_crawl_units(
+            self,
+            units: Sequence[tuple[str, int, datetime, datetime, str]],
+    ) -> None:
+        """
+        Добавляет в журнал обхода новые единицы работы со статусом pending.
+        Уже записанные единицы не меняются. Запись идет при flush
+        раньше отметок о выполнении, в той же транзакции.
+        :param units: Кортежи (запрос, страница, начало окна, конец окна, поле даты окна)
+        """
+        self.__new_unit_rows.extend(
+            {
+                "query": query,
+                "page": page,
+                "window_start": start,
+                "window_end": end,
+                "field": field,
+                "status": PENDING,
+            }
+            for query, page, start, end, field in units
+        )
+        if len(self.__new_unit_rows) >= self.__batch_size:
+            await self.flush()
+
+
+    async def finish_crawl_unit(
+            self,
+            query: str,
+            page: int,
+            status: str,
+            total_count: Optional[int] = None,
+            attempts: Optional[int] = None,
+            error: Optional[str] = None,
     ) -> None:
-        """Добавляет объекты RepoInfo в таблицу в базе данных"""
-        async with self.session() as session: # открыли сессию
+        """
+        Отмечает в журнале обхода результат обработки страницы.
+        Запись идет в одной транзакции с репозиториями страницы при flush,
+        поэтому страница не окажется выполненной без своих данных.
+        :param attempts: Сколько попыток потрачено на неудачную страницу
+        :param error: Описание ошибки неудачной страницы
+        """
+        self.__unit_rows.append(
+            {
+                "b_query": query,
+                "b_page": page,
+                "status": status,
+                "total_count": total_count,
+                "fetched_at": datetime.now(),
+                "attempts": attempts,
+                "error": error,
+            }
+        )
+        if len(self.__unit_rows) >= self.__batch_size:
+            await self.flush()
+
+
+    async def add_page_etag(self, query: str, page: int, etag: str, total_count: int) -> None:
+        """
+        Запоминает ETag полного ответа на страницу. Пишется при flush в одной
+        транзакции с репозиториями страницы: ETag не переживет потерянные данные.
+        """
+        self.__etag_rows.append({"query": query, "page": page, "etag": etag, "total_count": total_count})
+        if len(self.__etag_rows) >= self.__batch_size:
+            await self.flush()
+
+
+    async def get_page_etags(self) -> list[PageETag]:
+        """Все сохраненные ETag страниц поиска."""
+        async with self.session() as session:
+            async with session.begin():
+                result = await session.execute(select(PageETag))
+                return list(result.scalars())
+
+
+    async def get_crawl_units(self, status: str) -> list[CrawlUnit]:
+        """Единицы работы журнала обхода с заданным статусом."""
+        async with self.session() as session:
             async with session.begin():
-                infos = [RepoInfo.model_validate(info) for info in infos]
-                session.add_all(infos) # Экземпляры добавлены в память, а не в БД
-                await session.commit() # Сохранили изменения в БД
+                result = await session.execute(select(CrawlUnit).where(CrawlUnit.status == status))
+                return list(result.scalars())
+
+
+    async def import_crawl_journal(self, units: Sequence[CrawlUnit], etags: Sequence[PageETag]) -> None:
+        """
+        Переносит строки журнала обхода и ETag из другой базы (промежуточной
+        базы шарда) одной транзакцией. Строки с тем же запросом и страницей заменяются.
+        """
+        tables = (
+            (CrawlUnit, [unit.model_dump() for unit in units], [CrawlUnit.query, CrawlUnit.page]),
+            (PageETag, [etag.model_dump() for etag in etags], [PageETag.query, PageETag.page]),
+        )
+        async with self.engine.begin() as conn:
+            for table, rows, keys in tables:
+                if not rows:
+                    continue
+                columns = [name for name in rows[0] if name not in ("query", "page")]
+                await self.dialect.upsert(
+                    conn,
+                    table,
+                    rows,
+                    keys,
+                    lambda excluded: {name: excluded[name] for name in columns},
+                )
+
+
+    async def prune_page_etags(self) -> int:
+        """
+        Удаляет ETag запросов, которых нет в журнале обхода.
+        :return: Сколько строк удалено
+        """
+        async with self.session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    delete(PageETag).where(PageETag.query.not_in(select(CrawlUnit.query)))
+                )
+                return result.rowcount
+
+
+    async def get_unfinished_crawl_units(
+            self,
+            include_failed: bool = False,
+            field: Optional[str] = None,
+    ) -> list[CrawlUnit]:
+        """
+        Единицы работы, которые еще не были обработаны.
+        :param include_failed: Добавить неудачные страницы (status failed)
+        :param field: Только окна по этому полю даты (created или pushed)
+        """
+        statuses = [PENDING, FAILED] if include_failed else [PENDING]
+        async with self.session() as session:
+            async with session.begin():
+                query = select(CrawlUnit).where(CrawlUnit.status.in_(statuses))
+                if field is not None:
+                    query = query.where(CrawlUnit.field == field)
+                result = await session.execute(query)
+                return list(result.scalars())
+
+
+    async def count_failed_crawl_units(self) -> int:
+        """Сколько страниц ждут повторной загрузки с --replay-failed."""
+        async with self.session() as session:
+            async with session.begin():
+                query = select(func.count()).select_from(CrawlUnit).where(CrawlUnit.status == FAILED)
+                result = await session.execute(query)
+                return result.scalar()
+
+
+    async def last_completed_window_end(self) -> Optional[datetime]:
+        """Конец самого позднего полностью обработанного окна по дате создания."""
+        async with self.session() as session:
+            async with session.begin():
+                query = (
+                    select(func.max(CrawlUnit.window_end))
+                    .where(CrawlUnit.status == DONE, CrawlUnit.field == CREATED)
+                )
+                result = await session.execute(query)
+                return result.scalar()
+
+
+    async def last_window_end(self, field: str) -> Optional[datetime]:
+        """Конец самого позднего окна по полю field в журнале, в любом статусе."""
+        async with self.session() as session:
+            async with session.begin():
+                query = select(func.max(CrawlUnit.window_end)).where(CrawlUnit.field == field)
+                result = await session.execute(query)
+                return result.scalar()
+
+
+    async def first_fetched_at(self) -> Optional[datetime]:
+        """Когда была загружена самая ранняя страница текущего обхода по дате создания."""
+        async with self.session() as session:
+            async with session.begin():
+                query = (
+                    select(func.min(CrawlUnit.fetched_at))
+                    .where(CrawlUnit.status == DONE, CrawlUnit.field == CREATED)
+                )
+                result = await session.execute(query)
+                return result.scalar()
+
+
+    async def reset_crawl_units(self) -> None:
+        """Очищает журнал обхода перед новым полным обходом."""
+        async with self.session() as session:
+            async with session.begin():
+                await session.execute(delete(CrawlUnit))
+
+
+    async def reset_crawl_shards(self, windows: list[tuple[datetime, datetime]]) -> None:
+        """Заменяет шарды распределенного обхода новыми (id по порядку с 1)."""
+        async with self.session() as session:
+            async with session.begin():
+                await session.execute(delete(CrawlShard))
+                session.add_all(
+                    CrawlShard(id=i, window_start=start, window_end=end, status=PENDING, leases=0)
+                    for i, (start, end) in enumerate(windows, start=1)
+                )
+
+
+    async def get_crawl_shards(self, status: Optional[str] = None) -> list[CrawlShard]:
+        """Шарды распределенного обхода, все или с заданным статусом."""
+        async with self.session() as session:
+            async with session.begin():
+                query = select(CrawlShard).order_by(CrawlShard.id)
+                if status is not None:
+                    query = query.where(CrawlShard.status == status)
+                result = await session.execute(query)
+                return list(result.scalars())
+
+
+    async def retry_failed_crawl_shards(self) -> int:
+        """Возвращает неудачные шарды в очередь. :return: Сколько шардов вернулось"""
+        async with self.session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(CrawlShard).where(CrawlShard.status == FAILED).values(status=PENDING)
+                )
+                return result.rowcount
+
+
+    async def lease_crawl_shard(self, worker: str, lease: timedelta) -> Optional[CrawlShard]:
+        """
+        Берет в аренду свободный шард или шард с истекшей арендой.
+        Выбор и захват идут отдельными запросами: несколько воркеров могут
+        выбрать один шард, но строку изменит только тот, кто застал
+        ее прежний номер аренды (leases), остальные выберут снова.
+        :return: Шард или None, если свободных нет
+        """
+        while True:
+            async with self.session() as session:
+                async with session.begin():
+                    query = (
+                        select(CrawlShard)
+                        .where(
+                            (CrawlShard.status == PENDING)
+                            | (
+                                (CrawlShard.status == LEASED)
+                                & (CrawlShard.lease_until < self.dialect.utc_now())
+                            )
+                        )
+                        .order_by(CrawlShard.id)
+                        .limit(1)
+                    )
+                    shard = (await session.execute(query)).scalar_one_or_none()
+            if shard is None:
+                return None
+
+            async with self.session() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        update(CrawlShard)
+                        .where(CrawlShard.id == shard.id, CrawlShard.leases == shard.leases)
+                        .values(
+                            status=LEASED,
+                            worker=worker,
+                            lease_until=self.dialect.utc_now(lease),
+                            leases=shard.leases + 1,
+                        )
+                    )
+                    if result.rowcount == 1:
+                        # lease_until посчитан базой: шард перечитывается
+                        return await session.get(CrawlShard, shard.id, populate_existing=True)
+
+
+    async def renew_crawl_shard(self, shard_id: int, worker: str, lease: timedelta) -> bool:
+        """Продлевает аренду шарда. :return: False, если аренду уже забрал другой воркер"""
+        async with self.session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(CrawlShard)
+                    .where(
+                        CrawlShard.id == shard_id,
+                        CrawlShard.worker == worker,
+                        CrawlShard.status == LEASED,
+                    )
+                    .values(lease_until=self.dialect.utc_now(lease))
+                )
+                return result.rowcount == 1
+
+
+    async def finish_crawl_shard(
+            self,
+            shard_id: int,
+            status: str,
+            worker: Optional[str] = None,
+            error: Optional[str] = None,
+    ) -> bool:
+        """
+        Записывает результат обхода или переноса шарда.
+        :param worker: Если задан, статус меняется, только пока аренда у этого воркера
+        :return: Изменен ли шард
+        """
+        query = update(CrawlShard).where(CrawlShard.id == shard_id)
+        if worker is not None:
+            query = query.where(CrawlShard.worker == worker, CrawlShard.status == LEASED)
+        async with self.session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    query.values(status=status, lease_until=None, error=error)
+                )
+                return result.rowcount == 1
+
+
+    async def stream_repo_rows(
+            self,
+            chunk_size: int,
+            columns: Optional[Sequence] = None,
+    ) -> AsyncIterator[list[Row]]:
+        """
+        Построчно читает таблицу репозиториев серверным курсором
+        и отдает ее частями: в памяти не больше chunk_size строк.
+        :param chunk_size: Число строк в одной части
+        :param columns: Выбираемые столбцы или выражения, по умолчанию
+            (id, full_name, language, created_at, pushed_at, created_year)
+        :return: Части со строками выбранных столбцов
+        """
+        if columns is None:
+            columns = [
+                RepoInfo.id,
+                RepoInfo.full_name,
+                RepoInfo.language,
+                RepoInfo.created_at,
+                RepoInfo.pushed_at,
+                RepoInfo.created_year,
+            ]
+        # Соединение Core, а не сессия: строки не проходят через загрузку ORM,
+        # чтение большой таблицы так почти вдвое быстрее
+        async with self.engine.connect() as conn:
+            query = select(*columns).execution_options(yield_per=chunk_size)
+            result = await conn.stream(query)
+            async for rows in result.partitions(chunk_size):
+                yield rows
+
+
+    async def stream_repo_batches(
+            self,
+            chunk_size: int,
+            columns: Optional[Sequence] = None,
+    ) -> AsyncIterator["pa.RecordBatch"]:
+        """
+        То же, что stream_repo_rows, но части отдаются пакетами Arrow
+        (нужен pyarrow). Столбцы пакета называются как выбранные столбцы
+        или метки выражений.
+        :param columns: По умолчанию столбцы выгрузки export_data.py: id, full_name,
+            language, created_at и pushed_at в секундах от эпохи
+        """
+        import pyarrow as pa # нужен только потоковой аналитике
+
+        if columns is None:
+            columns = [
+                RepoInfo.id,
+                RepoInfo.full_name,
+                RepoInfo.language,
+                epoch(RepoInfo.created_at).label("created_at"),
+                epoch(RepoInfo.pushed_at).label("pushed_at"),
+            ]
+        names = list(select(*columns).selected_columns.keys())
+        async for rows in self.stream_repo_rows(chunk_size, columns):
+            yield pa.RecordBatch.from_arrays([pa.array(values) for values in zip(*rows)], names=names)
 
 
     async def min_date(self) -> datetime:
@@ -65,108 +824,117 @@ class DataBase:
                 return result.scalar()
 
 
+    @cached_query
+    async def get_rollup(self, session: AsyncSession) -> "pd.DataFrame":
+        """
+        Возвращает все предагрегированные счетчики одной выборкой:
+        из нее в памяти строятся все отчеты (см. analytics.Report).
+        :return: DataFrame со столбцами: created_year, pushed_year, active, language, count
+        """
+        query = select(
+            RepoRollup.created_year,
+            RepoRollup.pushed_year,
+            RepoRollup.active,
+            RepoRollup.language,
+            RepoRollup.count,
+        )
+        result = await session.execute(query)
+        return frame(
+            result.all(), ["created_year", "pushed_year", "active", "language", "count"]
+        )
+
+
+    @cached_query
     async def get_active_repository_lifespans(
             self,
+            session: AsyncSession,
             date_from: Optional[datetime] = None,
             date_to: Optional[datetime] = None
-    ) -> pd.DataFrame:
+    ) -> "pd.DataFrame":
         """
         Функция считает, сколько репозиториев живет 1, 2, 3... лет
         от сегодняшнего момента - у которых последний коммит после
-        даты active_after
+        даты active_after. Границы date_from и date_to учитываются
+        с точностью до года.
         """
-        if date_from is None:
-            date_from = await self.min_date()
-
-        if date_to is None:
-            date_to = await self.max_date()
-
-        async with self.session() as session:
-            async with session.begin():
-                query = (
-                    select(func.strftime("%Y", RepoInfo.created_at).label("year"), func.count())
-                    .where(RepoInfo.pushed_at > ACTIVE_AFTER)
-                    .where(RepoInfo.created_at.between(date_from, date_to))
-                    .group_by("year")
-                    )
-                result = await session.execute(query)
-                dataframe = pd.DataFrame(
-                    result.all(),
-                    columns=["year", "count"]
-                )
-                dataframe.set_index("year", inplace=True)
-                return dataframe
+        query = (
+            select(RepoRollup.created_year.label("year"), func.sum(RepoRollup.count))
+            .where(RepoRollup.active)
+            .group_by("year")
+            .order_by("year")
+        )
+        if date_from is not None:
+            query = query.where(RepoRollup.created_year >= date_from.year)
+        if date_to is not None:
+            query = query.where(RepoRollup.created_year <= date_to.year)
+        result = await session.execute(query)
+        dataframe = frame(result.all(), ["year", "count"])
+        dataframe["year"] = dataframe["year"].astype(str)
+        dataframe.set_index("year", inplace=True)
+        return dataframe
 
 
+    @cached_query
     async def get_language(
             self,
+            session: AsyncSession,
             year_created: int,
-    ) -> pd.DataFrame:
+    ) -> "pd.DataFrame":
         """
         Возвращает топ языков для репозиториев конкретного возраста.
         :param year_created: Год создания репозитория
         :return: DataFrame со столбцами: language, count
         """
-        async with self.session() as session:
-            async with session.begin():
-                query = (
-                    select(RepoInfo.language, func.count())
-                    .where(RepoInfo.language.isnot(None))
-                    .where(func.strftime("%Y", RepoInfo.created_at) == str(year_created))
-                    .where(RepoInfo.pushed_at > ACTIVE_AFTER)
-                    .group_by(RepoInfo.language)
-                )
-                result = await session.execute(query)
-                dataframe = pd.DataFrame(
-                    result.all(),
-                    columns=["language", "count"]
-                )
-                dataframe.set_index("language", inplace=True)
-                return dataframe
+        query = (
+            select(RepoRollup.language, func.sum(RepoRollup.count))
+            .where(RepoRollup.language != "")
+            .where(RepoRollup.created_year == year_created)
+            .where(RepoRollup.active)
+            .group_by(RepoRollup.language)
+        )
+        result = await session.execute(query)
+        dataframe = frame(result.all(), ["language", "count"])
+        dataframe.set_index("language", inplace=True)
+        return dataframe
 
 
-    async def get_count_last_push(self) -> pd.DataFrame:
+    @cached_query
+    async def get_count_last_push(self, session: AsyncSession) -> "pd.DataFrame":
         """
         Возвращает, сколько репозиториев
         сделали свой последний коммит в каждом году
         """
-        async with self.session() as session:
-            async with session.begin():
-                query = (
-                    select(
-                        func.strftime("%Y", RepoInfo.pushed_at).label("year"),
-                        func.count(),
-                    )
-                    .group_by("year")
-                )
-                result = await session.execute(query)
-                dataframe = pd.DataFrame(
-                    result.all(),
-                    columns=["year", "count"]
-                )
-                dataframe.set_index("year", inplace=True)
-                return dataframe
+        query = (
+            select(
+                RepoRollup.pushed_year.label("year"),
+                func.sum(RepoRollup.count),
+            )
+            .group_by("year")
+            .order_by("year")
+        )
+        result = await session.execute(query)
+        dataframe = frame(result.all(), ["year", "count"])
+        dataframe["year"] = dataframe["year"].astype(str)
+        dataframe.set_index("year", inplace=True)
+        return dataframe
 
 
-    async def get_count_created_repo(self) -> pd.DataFrame:
+    @cached_query
+    async def get_count_created_repo(self, session: AsyncSession) -> "pd.DataFrame":
         """
         Возвращает, сколько репозиториев
         были созданы в каждом году
         """
-        async with self.session() as session:
-            async with session.begin():
-                query = (
-                    select(
-                        func.strftime("%Y", RepoInfo.created_at).label("year"),
-                        func.count(),
-                    )
-                    .group_by("year")
-                )
-                result = await session.execute(query)
-                dataframe = pd.DataFrame(
-                    result.all(),
-                    columns=["year", "count"]
-                )
-                dataframe.set_index("year", inplace=True)
-                return dataframe
-
+        query = (
+            select(
+                RepoRollup.created_year.label("year"),
+                func.sum(RepoRollup.count),
+            )
+            .group_by("year")
+            .order_by("year")
+        )
+        result = await session.execute(query)
+        dataframe = frame(result.all(), ["year", "count"])
+        dataframe["year"] = dataframe["year"].astype(str)
+        dataframe.set_index("year", inplace=True)
+        return dataframe
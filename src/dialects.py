@@ -0,0 +1,154 @@
+import logging
+from datetime import timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import Column, DateTime, MetaData, Table, event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.sql import ColumnCollection
+
+
+# С какого размера пакета PostgreSQL загружает строки через COPY, а не executemany
+COPY_THRESHOLD = 1000
+
+
+class SqliteDialect:
+    """
+    Особенности SQLite для DataBase: upsert через INSERT ... ON CONFLICT,
+    WAL и synchronous=NORMAL при подключении, checkpoint при закрытии.
+    """
+    name = "sqlite"
+
+
+    def configure(self, engine: AsyncEngine) -> None:
+        event.listen(engine.sync_engine, "connect", self.__set_pragmas)
+
+
+    @staticmethod
+    def __set_pragmas(dbapi_connection, connection_record) -> None:
+        """
+        WAL не блокирует читателей во время записи, а synchronous=NORMAL
+        в режиме WAL делает fsync только при checkpoint, а не на каждый commit.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+    def insert(self, table):
+        return sqlite.insert(table)
+
+
+    def utc_now(self, offset: timedelta = timedelta()):
+        """
+        Выражение: текущее время UTC по часам базы плюс offset. Аренды шардов
+        сверяются с ним, а не с часами воркеров: у машин могут различаться
+        часовые пояса и ход часов. Формат совпадает с тем, в котором SQLAlchemy
+        хранит datetime в SQLite, поэтому сравнение строк - сравнение дат.
+        """
+        return func.strftime(
+            "%Y-%m-%d %H:%M:%f000", "now", f"{offset.total_seconds():+f} seconds", type_=DateTime
+        )
+
+
+    async def upsert(
+            self,
+            conn: AsyncConnection,
+            table,
+            rows: list[dict],
+            keys: list,
+            values: Optional[Callable[[ColumnCollection], dict]] = None,
+    ) -> None:
+        """
+        Вставляет строки; при конфликте по keys обновляет столбцы values(excluded)
+        или, если values не задан, оставляет существующую строку.
+        """
+        query = self.insert(table)
+        if values is None:
+            query = query.on_conflict_do_nothing(index_elements=keys)
+        else:
+            query = query.on_conflict_do_update(index_elements=keys, set_=values(query.excluded))
+        await conn.execute(query, rows)
+
+
+    async def checkpoint(self, conn: AsyncConnection) -> None:
+        """Переносит WAL в основной файл базы (с fsync)."""
+        await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+class PostgresDialect(SqliteDialect):
+    """
+    PostgreSQL (asyncpg): тот же INSERT ... ON CONFLICT, но крупные пакеты
+    загружаются через COPY во временную таблицу и переносятся одним
+    INSERT ... SELECT, что намного быстрее построчного executemany.
+    Экспериментальный: проверяется только benchmarks/check_backends.py
+    на доступном сервере PostgreSQL.
+    """
+    name = "postgresql"
+
+
+    def configure(self, engine: AsyncEngine) -> None:
+        pass
+
+
+    def insert(self, table):
+        return postgresql.insert(table)
+
+
+    def utc_now(self, offset: timedelta = timedelta()):
+        return func.timezone("UTC", func.now(), type_=DateTime) + offset
+
+
+    async def upsert(
+            self,
+            conn: AsyncConnection,
+            table,
+            rows: list[dict],
+            keys: list,
+            values: Optional[Callable[[ColumnCollection], dict]] = None,
+    ) -> None:
+        if len(rows) < COPY_THRESHOLD or conn.dialect.driver != "asyncpg":
+            await super().upsert(conn, table, rows, keys, values)
+            return
+
+        table = getattr(table, "__table__", table)
+        columns = list(rows[0])
+        staging = Table(
+            f"staging_{table.name}",
+            MetaData(),
+            *(Column(name, table.c[name].type) for name in columns),
+            prefixes=["TEMPORARY"],
+            postgresql_on_commit="DELETE ROWS",
+        )
+        await conn.run_sync(lambda sync_conn: staging.create(sync_conn, checkfirst=True))
+        raw_connection = await conn.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            staging.name,
+            records=[tuple(row[name] for name in columns) for row in rows],
+            columns=columns,
+        )
+        query = self.insert(table).from_select(columns, select(staging))
+        if values is None:
+            query = query.on_conflict_do_nothing(index_elements=keys)
+        else:
+            query = query.on_conflict_do_update(index_elements=keys, set_=values(query.excluded))
+        await conn.execute(query)
+        await conn.execute(staging.delete()) # следующий пакет этой же транзакции
+
+
+    async def checkpoint(self, conn: AsyncConnection) -> None:
+        pass
+
+
+DIALECTS = {dialect.name: dialect for dialect in (SqliteDialect, PostgresDialect)}
+
+
+def get_dialect(engine: AsyncEngine) -> SqliteDialect:
+    """Особенности движка базы по его SQLAlchemy-диалекту."""
+    if engine.dialect.name not in DIALECTS:
+        logging.warning(f"Движок {engine.dialect.name} не проверялся, запросы как для SQLite")
+        return SqliteDialect()
+    dialect = DIALECTS[engine.dialect.name]()
+    dialect.configure(engine)
+    return dialect
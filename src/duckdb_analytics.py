@@ -0,0 +1,127 @@
+import os
+from datetime import datetime
+from typing import Optional
+
+import duckdb
+import pandas as pd
+
+from analytics import ROLLUP_COLUMNS
+
+
+class DuckDbAnalytics:
+    """
+    Аналитика в DuckDB по выгрузке Parquet (export_data.py). DuckDB читает
+    только нужные столбцы и считает группировки векторно по колонкам, поэтому
+    отчеты по сырым строкам идут без RepoRollup и без прохода по SQLite.
+    Возвращает те же DataFrame, что аналитические методы DataBase.
+
+    У DuckDB нет асинхронного драйвера для SQLAlchemy, поэтому основной
+    базой сбора он не служит: сбор пишет в SQLite или PostgreSQL, а DuckDB
+    работает с выгрузкой.
+    """
+    def __init__(self, directory: str, active_after: datetime) -> None:
+        self.__connection = duckdb.connect()
+        # Путь передается через API, а не текстом SQL: кавычки в имени каталога безопасны
+        self.__connection.read_parquet(
+            os.path.join(directory, "**", "*.parquet"), hive_partitioning=True
+        ).create_view("export")
+        # Годы считаются по секундам от эпохи в UTC, как в SQLite
+        self.__connection.execute(
+            f"""
+            CREATE VIEW repos AS
+            SELECT
+                created_year::BIGINT AS created_year,
+                year(make_timestamp(pushed_at * 1000000)) AS pushed_year,
+                pushed_at > {int(pd.Timestamp(active_after).timestamp())} AS active,
+                language
+            FROM export
+            """
+        )
+
+
+    def close(self) -> None:
+        self.__connection.close()
+
+
+    def __query(self, sql: str, parameters: Optional[list] = None) -> pd.DataFrame:
+        return self.__connection.execute(sql, parameters or []).df()
+
+
+    @staticmethod
+    def __year_frame(dataframe: pd.DataFrame) -> pd.DataFrame:
+        if dataframe.empty:
+            return pd.DataFrame([], columns=["year", "count"]).set_index("year") # как у DataBase
+        dataframe["year"] = dataframe["year"].astype(str)
+        return dataframe.set_index("year")
+
+
+    def get_rollup(self) -> pd.DataFrame:
+        """
+        Те же счетчики, что хранит RepoRollup, посчитанные по выгрузке.
+        :return: DataFrame со столбцами: created_year, pushed_year, active, language, count
+        """
+        return self.__query(
+            """
+            SELECT created_year, pushed_year, active, coalesce(language, '') AS language,
+                count(*) AS count
+            FROM repos
+            GROUP BY ALL
+            ORDER BY ALL
+            """
+        )[ROLLUP_COLUMNS]
+
+
+    def get_active_repository_lifespans(
+            self,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        """Сколько активных репозиториев создано в каждом году (границы - с точностью до года)."""
+        return self.__year_frame(self.__query(
+            """
+            SELECT created_year AS year, count(*) AS count
+            FROM repos
+            WHERE active AND created_year >= coalesce(?, created_year)
+                AND created_year <= coalesce(?, created_year)
+            GROUP BY year
+            ORDER BY year
+            """,
+            [
+                date_from.year if date_from is not None else None,
+                date_to.year if date_to is not None else None,
+            ],
+        ))
+
+
+    def get_language(self, year_created: int) -> pd.DataFrame:
+        """
+        Языки активных репозиториев, созданных в заданном году.
+        :return: DataFrame со столбцами: language, count
+        """
+        dataframe = self.__query(
+            """
+            SELECT language, count(*) AS count
+            FROM repos
+            WHERE active AND created_year = ? AND language IS NOT NULL AND language <> ''
+            GROUP BY language
+            ORDER BY language
+            """,
+            [year_created],
+        )
+        if dataframe.empty:
+            return pd.DataFrame([], columns=["language", "count"]).set_index("language")
+        return dataframe.set_index("language")
+
+
+    def get_count_last_push(self) -> pd.DataFrame:
+        """Сколько репозиториев сделали свой последний коммит в каждом году."""
+        return self.__year_frame(self.__query(
+            "SELECT pushed_year AS year, count(*) AS count FROM repos GROUP BY year ORDER BY year"
+        ))
+
+
+    def get_count_created_repo(self) -> pd.DataFrame:
+        """Сколько репозиториев было создано в каждом году."""
+        return self.__year_frame(self.__query(
+            "SELECT created_year AS year, count(*) AS count FROM repos GROUP BY year ORDER BY year"
+        ))
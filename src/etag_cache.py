@@ -0,0 +1,38 @@
+from typing import NamedTuple, Optional
+
+from db_manager import DataBase
+
+
+class CachedPage(NamedTuple):
+    etag: str
+    total_count: int
+
+
+class ETagCache:
+    """
+    ETag страниц поиска по (запрос, страница) для заголовка If-None-Match.
+    Загружается из таблицы PageETag перед обходом; новые ETag пишутся
+    в базу вместе с данными страниц через DbWriter.
+    """
+    def __init__(self, pages: Optional[dict[tuple[str, int], CachedPage]] = None) -> None:
+        self.__pages = pages or {}
+
+
+    async def load(self, db: DataBase) -> None:
+        """Загружает ETag, сохраненные прошлыми обходами."""
+        self.__pages.update(
+            ((row.query, row.page), CachedPage(row.etag, row.total_count))
+            for row in await db.get_page_etags()
+        )
+
+
+    def __len__(self) -> int:
+        return len(self.__pages)
+
+
+    def get(self, query: str, page: int) -> Optional[CachedPage]:
+        return self.__pages.get((query, page))
+
+
+    def put(self, query: str, page: int, etag: str, total_count: int) -> None:
+        self.__pages[(query, page)] = CachedPage(etag, total_count)
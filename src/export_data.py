@@ -0,0 +1,130 @@
+import os
+import shutil
+import sys
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from db_manager import DataBase
+from settings import settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Схема выгрузки: даты - секунды от эпохи в int64, язык - словарь строк.
+# created_year в файлы не пишется: он задается каталогом партиции created_year=YYYY
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("full_name", pa.string()),
+    ("language", pa.dictionary(pa.int32(), pa.string())),
+    ("created_at", pa.int64()),
+    ("pushed_at", pa.int64()),
+])
+
+
+def rows_to_table(rows: list) -> pa.Table:
+    """Переводит часть строк RepoInfo в таблицу Arrow со схемой SCHEMA."""
+    ids, full_names, languages, created_at, pushed_at, _ = zip(*rows)
+    return pa.Table.from_arrays(
+        [
+            pa.array(ids, pa.int64()),
+            pa.array(full_names, pa.string()),
+            pa.array(languages, pa.string()).dictionary_encode(),
+            pa.array(created_at, pa.timestamp("s")).cast(pa.int64()),
+            pa.array(pushed_at, pa.timestamp("s")).cast(pa.int64()),
+        ],
+        schema=SCHEMA,
+    )
+
+
+async def export_repos(db: DataBase, directory: str, chunk_size: int) -> int:
+    """
+    Выгружает таблицу репозиториев в Parquet с партициями по году создания.
+    Таблица читается частями по chunk_size строк, поэтому расход памяти
+    не зависит от ее размера.
+    :return: Число выгруженных строк
+    """
+    # Партиции прошлой выгрузки заменяются целиком
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.startswith("created_year="):
+                shutil.rmtree(os.path.join(directory, name))
+
+    writers: dict[int, pq.ParquetWriter] = {}
+    exported = 0
+    try:
+        async for rows in db.stream_repo_rows(chunk_size):
+            table = rows_to_table(rows)
+            years = pa.array([row[5] for row in rows], pa.int32())
+            for year in pc.unique(years).to_pylist():
+                if year not in writers:
+                    partition = os.path.join(directory, f"created_year={year}")
+                    os.makedirs(partition, exist_ok=True)
+                    writers[year] = pq.ParquetWriter(
+                        os.path.join(partition, "part-0.parquet"), SCHEMA
+                    )
+                writers[year].write_table(table.filter(pc.equal(years, year)))
+            exported += len(rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return exported
+
+
+def read_parquet_rollup(
+        directory: str,
+        active_after: datetime,
+        batch_size: int = 1_000_000,
+) -> "pd.DataFrame":
+    """
+    Считает по выгрузке в Parquet те же счетчики, что хранит RepoRollup,
+    чтобы analytics.Report работал прямо по набору данных.
+    Файлы читаются пакетами, в памяти остаются только счетчики.
+    :return: DataFrame со столбцами: created_year, pushed_year, active, language, count
+    """
+    # pyarrow.dataset сам импортирует pandas, а выгрузке (export) они не нужны
+    import pandas as pd
+    import pyarrow.dataset as ds
+
+    from analytics import ROLLUP_COLUMNS
+
+    keys = ["created_year", "pushed_year", "active", "language"]
+    dataset = ds.dataset(directory, format="parquet", partitioning="hive")
+    active_after_ts = int(pd.Timestamp(active_after).timestamp())
+    rollup = pd.DataFrame(columns=ROLLUP_COLUMNS)
+    for batch in dataset.to_batches(
+            columns=["created_year", "pushed_at", "language"], batch_size=batch_size
+    ):
+        pushed_at = batch.column("pushed_at")
+        table = pa.table({
+            "created_year": batch.column("created_year").cast(pa.int32()),
+            "pushed_year": pc.year(pushed_at.cast(pa.timestamp("s"))),
+            "active": pc.greater(pushed_at, active_after_ts),
+            "language": pc.fill_null(batch.column("language").cast(pa.string()), ""),
+        })
+        counts = table.group_by(keys).aggregate([([], "count_all")]).to_pandas()
+        counts = counts.rename(columns={"count_all": "count"})
+        rollup = (
+            pd.concat([rollup, counts]) if not rollup.empty else counts
+        ).groupby(keys, as_index=False)["count"].sum()
+    return rollup[ROLLUP_COLUMNS]
+
+
+async def main(directory: str, chunk_size: int) -> None:
+    db = DataBase(settings.db_url)
+    await db.init()
+    try:
+        exported = await export_repos(db, directory, chunk_size)
+    finally:
+        await db.close()
+    print(f"Выгружено репозиториев: {exported} в {directory}")
+
+
+if __name__ == "__main__":
+    from cli import run # аргументы всех команд описаны в cli.py
+
+    run(["export", *sys.argv[1:]])
@@ -1,26 +1,169 @@
+import importlib.util
+import json
 import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple, Optional
 
 import httpx
-from pydantic import BaseModel
 
-from db_manager import RepoInfo
-from token_provider import Token
+from db_manager import RepoRecord
+from etag_cache import ETagCache
+from metrics import PARSE_SECONDS, REQUEST_SECONDS, REQUESTS
+from settings import settings
+from token_provider import SEARCH, Token
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# httpx сам распаковывает br, если установлен brotli
+ACCEPT_ENCODING = (
+    "br, gzip" if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi")
+    else "gzip"
+)
+
+
+class SearchResult(NamedTuple):
+    """
+    Attributes:
+        total_count (int): Число результатов запроса по данным GitHub.
+        items (list[RepoRecord]): Репозитории страницы; пусто, если страница не изменилась.
+        etag (str | None): ETag ответа для следующего условного запроса.
+        not_modified (bool): GitHub ответил 304: страница та же, что уже в базе.
+    """
+    total_count: int
+    items: list[RepoRecord]
+    etag: Optional[str] = None
+    not_modified: bool = False
+
+
+def parse_search_result(content: bytes) -> SearchResult:
+    """
+    Разбирает ответ поиска, извлекая из каждого репозитория только
+    сохраняемые поля, без валидации полных объектов GitHub.
+    :param content: Тело ответа /search/repositories
+    :return: Результат поиска с записями, готовыми к пакетной вставке
+    """
+    data = json_loads(content)
+    # Даты GitHub приходят в UTC вида 2024-01-01T00:00:00Z, храним их без часового пояса
+    parse_date = datetime.fromisoformat
+    items = [
+        RepoRecord(
+            item["id"],
+            item["full_name"],
+            item["language"],
+            parse_date(item["created_at"][:19]),
+            parse_date(item["pushed_at"][:19]),
+        )
+        for item in data["items"]
+    ]
+    return SearchResult(data["total_count"], items)
 
 
-class SearchResult(BaseModel):
-    total_count: int
-    items: list[RepoInfo]
+class ApiException(Exception):
+    """
+    Ошибка запроса к GitHub API.
+    Attributes:
+        retry_after (float | None): Через сколько секунд повторить запрос,
+        если сервер прислал Retry-After.
+    """
+    def __init__(self, message: str = "", retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
 
 
-class ApiRateException(Exception):
+class ApiRateException(ApiException):
+    """Токен исчерпал основной лимит запросов (403/429 с X-RateLimit-Remaining: 0)."""
     pass
 
 
+class ApiSecondaryRateException(ApiException):
+    """
+    Вторичный лимит GitHub (403/429 при оставшемся основном лимите):
+    слишком частые или параллельные запросы, нужно замедлиться.
+    """
+    pass
+
+
+class ApiTransientException(ApiException):
+    """Временный сбой: таймаут, обрыв соединения, 5xx или поврежденный ответ."""
+    pass
+
+
+class ApiPermanentException(ApiException):
+    """Запрос отклонен (например, 422): повтор не поможет."""
+    pass
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After в секундах: GitHub присылает число, но допускается и HTTP-дата."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
 class Fetcher:
-    def __init__(self, token: Token, per_page: int = 100) -> None:
+    """
+    Клиент поиска GitHub с явно настроенным пулом соединений.
+    Используется как асинхронный контекстный менеджер, закрывающий соединения.
+    С etag_cache запросы условные: неизменившаяся страница приходит как 304
+    без тела и не разбирается.
+    """
+    def __init__(
+            self,
+            token: Token,
+            per_page: int = 100,
+            base_url: str = settings.api_url,
+            max_connections: int = settings.http_max_connections,
+            keepalive_expiry: float = settings.http_keepalive_expiry,
+            http2: bool = settings.http2,
+            etag_cache: Optional[ETagCache] = None,
+    ) -> None:
         self.__per_page = per_page # репозиториев на странице
         self.__token = token
-        self.__httpx_client = httpx.AsyncClient()
+        self.__etag_cache = etag_cache
+        self.__httpx_client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=http2 and self.__http2_available(),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                settings.http_read_timeout, connect=settings.http_connect_timeout
+            ),
+            headers={
+                "Accept": "application/vnd.github+json",
+                "Accept-Encoding": ACCEPT_ENCODING,
+            },
+        )
+
+
+    @staticmethod
+    def __http2_available() -> bool:
+        if importlib.util.find_spec("h2") is None:
+            logging.info("Пакет h2 не установлен, запросы идут по HTTP/1.1")
+            return False
+        return True
+
+
+    async def __aenter__(self) -> "Fetcher":
+        return self
+
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
 
 
     @property
@@ -33,21 +176,25 @@ class Fetcher:
         return self.__token
 
 
-    @token.setter
-    def token(self, token: Token) -> None:
-        self.__token = token
+    async def close(self) -> None:
+        """Закрывает HTTP-клиент и его соединения."""
+        await self.__httpx_client.aclose()
 
 
-    async def fetch_repos_page(self, page: int, query: str) -> list[RepoInfo]:
+    async def fetch_repos_page(self, page: int, query: str) -> SearchResult:
         """
         Функция загружает одну страницу результатов поиска репозиториев с GitHub API.
         :param page: Номер страницы результатов поиска
         :param query: Поисковый запрос
-        :return: Список репозиториев на одной странице
+        :return: Результат поиска: общее число найденных репозиториев и список репозиториев на странице
         """
+        token = self.__token
         headers = {
-            "Authorization": f"Bearer {self.token.value}",
+            "Authorization": f"Bearer {token.value}",
         }
+        cached = self.__etag_cache.get(query, page) if self.__etag_cache is not None else None
+        if cached is not None:
+            headers["If-None-Match"] = cached.etag
         params = httpx.QueryParams(
             {
                 "q": query,
@@ -58,14 +205,41 @@ class Fetcher:
             }
         )
         logging.info(f"Параметры запроса: {params}")
-        response = await self.__httpx_client.get(
-            "https://api.github.com/search/repositories", params=params, headers=headers
-        )
-
-        if response.status_code == httpx.codes.FORBIDDEN:
-            raise ApiRateException
-
-        result = SearchResult(**response.json())
+        try:
+            with REQUEST_SECONDS.time():
+                response = await self.__httpx_client.get(
+                    "/search/repositories", params=params, headers=headers
+                )
+        except httpx.TransportError as e: # таймауты и обрывы соединения
+            REQUESTS.inc("error")
+            raise ApiTransientException(f"{type(e).__name__}: {e}") from e
+        REQUESTS.inc(str(response.status_code))
+
+        token.update_rate_limit(response.headers)
+        retry_after = parse_retry_after(response.headers.get("retry-after"))
+
+        if response.status_code in (httpx.codes.FORBIDDEN, httpx.codes.TOO_MANY_REQUESTS):
+            if retry_after is None and response.headers.get("x-ratelimit-remaining") == "0":
+                token.exhaust(response.headers.get("x-ratelimit-resource", SEARCH))
+                raise ApiRateException(f"HTTP {response.status_code}")
+            raise ApiSecondaryRateException(f"HTTP {response.status_code}", retry_after)
+
+        if response.status_code == httpx.codes.NOT_MODIFIED and cached is not None:
+            logging.info(f"Страница {page} не изменилась")
+            return SearchResult(cached.total_count, [], cached.etag, not_modified=True)
+
+        if response.status_code >= httpx.codes.INTERNAL_SERVER_ERROR:
+            raise ApiTransientException(f"HTTP {response.status_code}", retry_after)
+
+        if response.status_code != httpx.codes.OK:
+            raise ApiPermanentException(f"HTTP {response.status_code}: {response.text[:200]}")
+
+        try:
+            with PARSE_SECONDS.time():
+                result = parse_search_result(response.content)
+        except (ValueError, KeyError, TypeError) as e: # обрезанный или неожиданный JSON
+            raise ApiTransientException(f"Некорректный ответ: {e!r}") from e
+        result = result._replace(etag=response.headers.get("etag"))
         logging.info(f"Считал страницу {page} из {result.total_count}")
 
-        return result.items
\ No newline at end of file
+        return result
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+
+# Границы корзин гистограмм длительностей, секунды
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Монотонный счетчик, при необходимости с метками."""
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.__labels = labels
+        self.__values: dict[tuple, float] = {}
+
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.__values[labels] = self.__values.get(labels, 0) + amount
+
+
+    def total(self) -> float:
+        return sum(self.__values.values())
+
+
+    def lines(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.__values.items():
+            yield f"{self.name}{_format_labels(self.__labels, labels)} {value}"
+
+
+    def snapshot(self) -> dict:
+        return {",".join(map(str, labels)) or "": value for labels, value in self.__values.items()}
+
+
+class Gauge:
+    """Текущее значение, при необходимости с метками."""
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.__labels = labels
+        self.__values: dict[tuple, float] = {}
+
+
+    def set(self, value: float, *labels) -> None:
+        self.__values[labels] = value
+
+
+    def lines(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.__values.items():
+            yield f"{self.name}{_format_labels(self.__labels, labels)} {value}"
+
+
+    def snapshot(self) -> dict:
+        return {",".join(map(str, labels)) or "": value for labels, value in self.__values.items()}
+
+
+class Histogram:
+    """Распределение длительностей по корзинам, плюс сумма и число наблюдений."""
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.__buckets = buckets
+        self.__counts = [0] * len(buckets)
+        self.__sum = 0.0
+        self.__count = 0
+
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.__buckets):
+            if value <= bound:
+                self.__counts[i] += 1
+                break
+        self.__sum += value
+        self.__count += 1
+
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Замеряет длительность блока with."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+    def lines(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        cumulative = 0
+        for bound, count in zip(self.__buckets, self.__counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound}"}} {cumulative}'
+        yield f'{self.name}_bucket{{le="+Inf"}} {self.__count}'
+        yield f"{self.name}_sum {self.__sum}"
+        yield f"{self.name}_count {self.__count}"
+
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.__count,
+            "sum": self.__sum,
+            "mean": self.__sum / self.__count if self.__count else None,
+        }
+
+
+class MetricsRegistry:
+    """
+    Набор метрик процесса. Коллекторы - функции, которые обновляют
+    датчики (например, глубину очередей) перед каждой выгрузкой метрик.
+    """
+    def __init__(self) -> None:
+        self.__metrics: list[Counter | Gauge | Histogram] = []
+        self.__collectors: list[Callable[[], None]] = []
+
+
+    def counter(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.__register(Counter(name, description, labels))
+
+
+    def gauge(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self.__register(Gauge(name, description, labels))
+
+
+    def histogram(self, name: str, description: str) -> Histogram:
+        return self.__register(Histogram(name, description))
+
+
+    def __register(self, metric):
+        self.__metrics.append(metric)
+        return metric
+
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self.__collectors.append(collector)
+
+
+    def remove_collector(self, collector: Callable[[], None]) -> None:
+        self.__collectors.remove(collector)
+
+
+    def collect(self) -> None:
+        for collector in self.__collectors:
+            collector()
+
+
+    def render_prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus."""
+        self.collect()
+        return "\n".join(line for metric in self.__metrics for line in metric.lines()) + "\n"
+
+
+    def snapshot(self) -> dict:
+        """Метрики в виде словаря для JSON."""
+        self.collect()
+        return {metric.name: metric.snapshot() for metric in self.__metrics}
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter("github_requests_total", "Запросы к GitHub API по коду ответа", ("status",))
+REQUEST_SECONDS = registry.histogram("github_request_seconds", "Длительность запроса к GitHub API")
+PARSE_SECONDS = registry.histogram("github_parse_seconds", "Разбор страницы поиска")
+RETRIES = registry.counter("crawl_retries_total", "Повторы страниц по причине", ("reason",))
+PAGES = registry.counter("crawl_pages_total", "Обработанные страницы по результату", ("result",))
+ROWS = registry.counter("crawl_rows_total", "Репозитории, переданные на запись")
+QUEUE_DEPTH = registry.gauge("crawl_queue_depth", "Глубина очередей", ("queue",))
+TOKEN_REMAINING = registry.gauge("token_remaining", "Остаток search-лимита токена", ("token",))
+BREAKER_OPEN = registry.gauge("crawl_breaker_open", "Разомкнут ли предохранитель (1/0)")
+DB_FLUSH_SECONDS = registry.histogram("db_flush_seconds", "Длительность транзакции записи в базу")
+DB_ROWS = registry.counter("db_rows_written_total", "Строки, записанные в базу", ("table",))
+
+
+class MetricsExporter:
+    """
+    Публикует метрики: по HTTP в формате Prometheus (GET /metrics на port)
+    и/или периодическим JSON-снимком в файл с темпом страниц и строк в секунду.
+    """
+    def __init__(
+            self,
+            metrics: MetricsRegistry = registry,
+            port: Optional[int] = None,
+            snapshot_path: Optional[str] = None,
+            interval: float = 10.0,
+    ) -> None:
+        self.__registry = metrics
+        self.__port = port
+        self.__snapshot_path = snapshot_path
+        self.__interval = interval
+        self.__server: asyncio.Server | None = None
+        self.__task: asyncio.Task | None = None
+        self.__last = (time.monotonic(), PAGES.total(), ROWS.total())
+
+
+    async def start(self) -> None:
+        if self.__port is not None:
+            self.__server = await asyncio.start_server(self.__handle, "127.0.0.1", self.__port)
+            logging.info(f"Метрики: http://127.0.0.1:{self.__port}/metrics")
+        if self.__snapshot_path is not None:
+            self.__task = asyncio.create_task(self.__write_snapshots())
+
+
+    async def close(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+            self.write_snapshot() # итоговый снимок
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+
+    def write_snapshot(self) -> None:
+        now, pages, rows = time.monotonic(), PAGES.total(), ROWS.total()
+        last_time, last_pages, last_rows = self.__last
+        elapsed = max(now - last_time, 1e-9)
+        snapshot = {
+            "time": time.time(),
+            "pages_per_second": (pages - last_pages) / elapsed,
+            "rows_per_second": (rows - last_rows) / elapsed,
+            "metrics": self.__registry.snapshot(),
+        }
+        self.__last = (now, pages, rows)
+        temporary = f"{self.__snapshot_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file, ensure_ascii=False, indent=2)
+        os.replace(temporary, self.__snapshot_path) # читатель не увидит файл наполовину
+
+
+    async def __write_snapshots(self) -> None:
+        while True:
+            await asyncio.sleep(self.__interval)
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                logging.error(f"Ошибка записи снимка метрик, {e}")
+
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            if request_line.split()[1:2] == [b"/metrics"]:
+                status, body = "200 OK", self.__registry.render_prometheus().encode()
+            else:
+                status, body = "404 Not Found", b""
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,199 @@
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from analytics import ROLLUP_COLUMNS
+from db_manager import DataBase, RepoInfo, epoch
+
+
+SECONDS_PER_YEAR = 365.2425 * 86400
+
+
+def to_years(epochs: np.ndarray) -> np.ndarray:
+    """Календарный год (UTC) для массива секунд от эпохи."""
+    return epochs.astype("datetime64[s]").astype("datetime64[Y]").astype(np.int64) + 1970
+
+
+class RepoArrays:
+    """
+    Таблица репозиториев в виде столбцов NumPy: даты - секунды от эпохи
+    в int64, язык - коды категорий (-1 для репозиториев без языка
+    и с пустым языком, как в RepoRollup).
+    """
+    def __init__(
+            self,
+            created_at: np.ndarray,
+            pushed_at: np.ndarray,
+            languages: pd.Categorical,
+    ) -> None:
+        if "" in languages.categories:
+            languages = languages.remove_categories([""])
+        self.created_at = created_at
+        self.pushed_at = pushed_at
+        self.language_codes = languages.codes.astype(np.int32)
+        self.language_names = np.asarray(languages.categories, dtype=object)
+
+
+    @classmethod
+    async def from_database(cls, db: DataBase, chunk_size: int = 500_000) -> "RepoArrays":
+        """Загружает столбцы из базы частями; даты переводятся в секунды на стороне SQLite."""
+        created_parts, pushed_parts, language_parts = [], [], []
+        columns = [epoch(RepoInfo.created_at), epoch(RepoInfo.pushed_at), RepoInfo.language]
+        async for rows in db.stream_repo_rows(chunk_size, columns):
+            created_at, pushed_at, languages = zip(*rows)
+            created_parts.append(np.fromiter(created_at, np.int64, len(rows)))
+            pushed_parts.append(np.fromiter(pushed_at, np.int64, len(rows)))
+            language_parts.append(pd.Categorical(languages))
+        if not created_parts:
+            return cls(np.empty(0, np.int64), np.empty(0, np.int64), pd.Categorical([]))
+        return cls(
+            np.concatenate(created_parts),
+            np.concatenate(pushed_parts),
+            pd.api.types.union_categoricals(language_parts, sort_categories=True),
+        )
+
+
+    @classmethod
+    def from_parquet(cls, directory: str) -> "RepoArrays":
+        """Загружает столбцы из выгрузки export_data.py."""
+        import pyarrow.dataset as ds
+
+        table = ds.dataset(directory, format="parquet", partitioning="hive").to_table(
+            columns=["created_at", "pushed_at", "language"]
+        )
+        languages = pd.Categorical(table.column("language").to_pandas())
+        return cls(
+            table.column("created_at").to_numpy(),
+            table.column("pushed_at").to_numpy(),
+            languages.reorder_categories(sorted(languages.categories)),
+        )
+
+
+class NumpyAnalytics:
+    """
+    Векторизованная замена аналитическим методам DataBase: распределения
+    считаются через np.bincount по годам. Возвращает те же DataFrame,
+    а get_rollup - счетчики для analytics.Report (analyze --engine numpy).
+    """
+    def __init__(self, arrays: RepoArrays, active_after: datetime) -> None:
+        self.__arrays = arrays
+        self.__created_year = to_years(arrays.created_at)
+        self.__pushed_year = to_years(arrays.pushed_at)
+        self.__active = arrays.pushed_at > int(pd.Timestamp(active_after).timestamp())
+
+
+    @staticmethod
+    def __year_frame(years: np.ndarray) -> pd.DataFrame:
+        if years.size == 0:
+            return pd.DataFrame([], columns=["year", "count"]).set_index("year") # как у DataBase
+        first = years.min()
+        counts = np.bincount(years - first)
+        present = np.flatnonzero(counts)
+        return pd.DataFrame(
+            {"count": counts[present].astype(np.int64)},
+            index=pd.Index((present + first).astype(str).astype(object), name="year"),
+        )
+
+
+    def get_rollup(self) -> pd.DataFrame:
+        """
+        Те же счетчики, что хранит RepoRollup, посчитанные по массивам.
+        :return: DataFrame со столбцами: created_year, pushed_year, active, language, count
+        """
+        if self.__created_year.size == 0:
+            return pd.DataFrame([], columns=ROLLUP_COLUMNS)
+        created_first = self.__created_year.min()
+        pushed_first = self.__pushed_year.min()
+        pushed_width = self.__pushed_year.max() - pushed_first + 1
+        languages = len(self.__arrays.language_names) + 1 # код 0 - без языка
+        keys = (
+            ((self.__created_year - created_first) * pushed_width + self.__pushed_year - pushed_first) * 2
+            + self.__active
+        ) * languages + self.__arrays.language_codes + 1
+        counts = np.bincount(keys)
+        keys = np.flatnonzero(counts)
+        keys, codes = np.divmod(keys, languages)
+        keys, active = np.divmod(keys, 2)
+        created, pushed = np.divmod(keys, pushed_width)
+        names = np.concatenate([[""], self.__arrays.language_names]).astype(object)
+        return pd.DataFrame({
+            "created_year": created + created_first,
+            "pushed_year": pushed + pushed_first,
+            "active": active.astype(bool),
+            "language": names[codes],
+            "count": counts[counts > 0].astype(np.int64),
+        })[ROLLUP_COLUMNS]
+
+
+    def get_active_repository_lifespans(
+            self,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        """Сколько активных репозиториев создано в каждом году (границы - с точностью до года)."""
+        mask = self.__active.copy()
+        if date_from is not None:
+            mask &= self.__created_year >= date_from.year
+        if date_to is not None:
+            mask &= self.__created_year <= date_to.year
+        return self.__year_frame(self.__created_year[mask])
+
+
+    def get_language(self, year_created: int) -> pd.DataFrame:
+        """
+        Языки активных репозиториев, созданных в заданном году.
+        :return: DataFrame со столбцами: language, count
+        """
+        codes = self.__arrays.language_codes
+        mask = self.__active & (self.__created_year == year_created) & (codes >= 0)
+        counts = np.bincount(codes[mask], minlength=len(self.__arrays.language_names))
+        present = np.flatnonzero(counts)
+        if present.size == 0:
+            return pd.DataFrame([], columns=["language", "count"]).set_index("language")
+        return pd.DataFrame(
+            {"count": counts[present].astype(np.int64)},
+            index=pd.Index(self.__arrays.language_names[present], name="language"),
+        )
+
+
+    def get_count_last_push(self) -> pd.DataFrame:
+        """Сколько репозиториев сделали свой последний коммит в каждом году."""
+        return self.__year_frame(self.__pushed_year)
+
+
+    def get_count_created_repo(self) -> pd.DataFrame:
+        """Сколько репозиториев было создано в каждом году."""
+        return self.__year_frame(self.__created_year)
+
+
+    def lifespan_histogram(self) -> pd.DataFrame:
+        """Сколько репозиториев прожило 0, 1, 2... полных лет от создания до последнего коммита."""
+        lifespans = (self.__arrays.pushed_at - self.__arrays.created_at) / SECONDS_PER_YEAR
+        counts = np.bincount(np.clip(lifespans, 0, None).astype(np.int64))
+        return pd.DataFrame(
+            {"count": counts.astype(np.int64)},
+            index=pd.RangeIndex(len(counts), name="years"),
+        )
+
+
+    def language_year_matrix(self, active_only: bool = True) -> pd.DataFrame:
+        """Матрица: языки по строкам, годы создания по столбцам, в ячейках - число репозиториев."""
+        codes = self.__arrays.language_codes
+        mask = codes >= 0
+        if active_only:
+            mask &= self.__active
+        if not mask.any():
+            return pd.DataFrame()
+        years = self.__created_year[mask]
+        first = years.min()
+        width = years.max() - first + 1
+        flat = codes[mask].astype(np.int64) * width + (years - first)
+        matrix = np.bincount(flat, minlength=len(self.__arrays.language_names) * width)
+        matrix = matrix.reshape(len(self.__arrays.language_names), width)
+        return pd.DataFrame(
+            matrix,
+            index=pd.Index(self.__arrays.language_names, name="language"),
+            columns=pd.Index(np.arange(first, first + width), name="year"),
+        ).loc[lambda frame: frame.sum(axis=1) > 0]
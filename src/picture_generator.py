@@ -1,52 +1,181 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
 import pandas as pd
 
-from matplotlib import pyplot as plt
-from pathlib import Path
+
+HISTOGRAM = "hist"
+PIE = "pie"
+
+# Параметры холста по типам графиков. Входят в хеш графика вместе с данными
+STYLES = {
+    HISTOGRAM: {"figsize": (10, 6), "dpi": 300},
+    PIE: {"figsize": (20, 15), "dpi": 300},
+}
+# Увеличивается при изменении кода отрисовки, чтобы сбросить кеш графиков
+STYLE_VERSION = 1
+
+MANIFEST_PATH = "media/manifest.json"
+
+
+class ChartJob(NamedTuple):
+    """
+    Задание на отрисовку одного графика. Содержит только небольшие списки
+    подписей и значений, чтобы дешево передаваться в процесс отрисовки.
+    """
+    kind: str
+    title: str
+    labels: list[str]
+    values: list[float]
+    x_title: str = ""
+    y_title: str = ""
+
+
+    @property
+    def path(self) -> str:
+        return f"media/{self.kind}_{self.title}.png"
+
+
+    @property
+    def digest(self) -> str:
+        """Хеш данных, подписей и стиля графика: одинаков для одинаковых картинок."""
+        content = json.dumps(
+            [STYLE_VERSION, STYLES[self.kind], *self], ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+
+def render(job: ChartJob) -> str:
+    """
+    Рисует график в файл и возвращает путь к нему. Выполняется в процессе
+    отрисовки: matplotlib импортируется только здесь и используется через
+    объектный API без глобального состояния pyplot.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(**STYLES[job.kind])
+    if job.kind == HISTOGRAM:
+        _draw_histogram(figure, job)
+    else:
+        _draw_pie(figure, job)
+    FigureCanvasAgg(figure)
+    figure.savefig(job.path)
+    figure.clear() # освобождаем память под объекты графика сразу
+    return job.path
+
+
+def _draw_histogram(figure, job: ChartJob) -> None:
+    ax = figure.add_subplot()
+    ax.bar(job.labels, job.values, color="skyblue", edgecolor="blue", alpha=0.8)
+    ax.set_title(job.title, fontsize=16)
+    ax.set_xlabel(job.x_title, fontsize=14)
+    ax.set_ylabel(job.y_title, fontsize=14)
+    for label in ax.get_xticklabels():
+        label.set(rotation=45, horizontalalignment="right")
+    ax.grid(axis="y", linestyle="--", alpha=0.7)
+    figure.tight_layout() # для отступов
+
+
+def _draw_pie(figure, job: ChartJob) -> None:
+    from matplotlib import colormaps
+
+    ax = figure.add_subplot(aspect="equal")
+    wedges, texts, autotexts = ax.pie(
+        job.values,
+        autopct=lambda pct: f"{pct:.1f}%", # Формат подписи процентов
+        textprops=dict(color="w", rotation=0), # Текст внутри
+        colors=colormaps["Set2"].colors,
+        startangle=45,
+    )
+    ax.legend(
+        wedges,
+        job.labels,
+        title="Языки",
+        loc="center left",
+        bbox_to_anchor=(1, 0, 0.5, 1), # Координаты: справа от графика
+        fontsize=24, # Размер шрифта названий
+        title_fontsize=28, # Размер шрифта заголовка "Языки"
+    )
+    for autotext in autotexts: # подписи внутри
+        autotext.set(size=18, weight=700)
+    ax.set_title(job.title, fontsize=46)
+    figure.tight_layout()
 
 
 class PictureGenerator:
+    @staticmethod
+    def histogram_job(
+            data: pd.Series,
+            title: str,
+            x_title: str,
+            y_title: str,
+    ) -> ChartJob:
+        return ChartJob(
+            HISTOGRAM, title, [str(label) for label in data.index], data.tolist(), x_title, y_title
+        )
+
+
+    @staticmethod
+    def pie_job(data: pd.Series, title: str) -> ChartJob:
+        return ChartJob(PIE, title, [str(label) for label in data.index], data.tolist())
+
+
+    @staticmethod
+    def render_all(jobs: list[ChartJob], force: bool = False) -> list[str]:
+        """
+        Рисует независимые графики параллельно в пуле процессов.
+        Графики, у которых в манифесте записан тот же хеш и файл на месте,
+        не перерисовываются. Файлы графиков, которых больше нет среди заданий,
+        удаляются.
+        :param force: Перерисовать все графики, не сравнивая хеши с манифестом
+            (устаревшие файлы все равно удаляются)
+        :return: Пути к нарисованным файлам
+        """
+        manifest = PictureGenerator.__load_manifest()
+        digests = {job.path: job.digest for job in jobs}
+
+        for path in manifest.keys() - digests.keys():
+            if os.path.exists(path):
+                os.remove(path)
+
+        pending = [
+            job for job in jobs
+            if force or manifest.get(job.path) != digests[job.path] or not os.path.exists(job.path)
+        ]
+        rendered = []
+        if pending:
+            workers = min(len(pending), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rendered = list(executor.map(render, pending))
+
+        with open(MANIFEST_PATH, "w", encoding="utf-8") as file:
+            json.dump(digests, file, ensure_ascii=False, indent=2)
+        return rendered
+
+
+    @staticmethod
+    def __load_manifest() -> dict[str, str]:
+        try:
+            with open(MANIFEST_PATH, encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+
     @staticmethod
     def generate_histogram_picture(
-            data: pd.DataFrame,
+            data: pd.Series,
             title: str,
             x_title: str,
             y_title: str,
-    ):
-        plt.figure(figsize=(10, 6), dpi=300)
-        plt.bar(data.index, data, color="skyblue", edgecolor="blue", alpha=0.8)
-        plt.title(title, fontsize=16)
-        plt.xlabel(x_title, fontsize=14)
-        plt.ylabel(y_title, fontsize=14)
-        plt.xticks(rotation=45, ha="right")
-        plt.grid(axis="y", linestyle="--", alpha=0.7)
-        plt.tight_layout() # для отступов
-        plt.savefig(f"media/hist_{title}.png")
+    ) -> str:
+        return render(PictureGenerator.histogram_job(data, title, x_title, y_title))
 
 
     @staticmethod
-    def generate_pie_picture(data: pd.DataFrame, title: str):
-        fig, ax = plt.subplots(
-            figsize=(20, 15),
-            subplot_kw=dict(aspect="equal"),
-            dpi=300,
-        )
-        wedges, texts, autotexts = ax.pie(
-            data,
-            autopct=lambda pct: f"{pct:.1f}%", # Формат подписи процентов
-            textprops=dict(color="w", rotation=0), # Текст внутри
-            colors=plt.cm.Set2.colors,
-            startangle=45,
-        )
-        ax.legend(
-            wedges,
-            data.index,
-            title="Языки",
-            loc="center left",
-            bbox_to_anchor=(1, 0, 0.5, 1), # Координаты: справа от графика
-            fontsize=24, # Размер шрифта названий
-            title_fontsize=28, # Размер шрифта заголовка "Языки"
-        )
-        plt.setp(autotexts, size=18, weight=700) # подписи внутри
-        ax.set_title(title, fontsize=46)
-        plt.tight_layout()
-        plt.savefig(f"media/pie_{title}.png")
+    def generate_pie_picture(data: pd.Series, title: str) -> str:
+        return render(PictureGenerator.pie_job(data, title))
@@ -0,0 +1,150 @@
+import math
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from dateutil.relativedelta import relativedelta
+
+
+# GitHub принимает в поиске даты с точностью до секунды
+MIN_WINDOW = timedelta(seconds=1)
+
+EPOCH = datetime(1970, 1, 1)
+YEAR = relativedelta(years=1)
+MONTH = relativedelta(months=1)
+# Шаги дробления окна от крупного к мелкому. Границы частей - начала лет и месяцев
+# или кратные шагу моменты от начала эпохи (UTC), а не доли самого окна,
+# поэтому в каждом запуске окна дробятся одинаково и запросы повторяются
+SPLIT_STEPS = (
+    YEAR, MONTH,
+    timedelta(days=7), timedelta(days=2), timedelta(days=1),
+    timedelta(hours=12), timedelta(hours=6), timedelta(hours=3), timedelta(hours=1),
+    timedelta(minutes=30), timedelta(minutes=10), timedelta(minutes=5), timedelta(minutes=1),
+    timedelta(seconds=30), timedelta(seconds=10), timedelta(seconds=5), MIN_WINDOW,
+)
+
+# Поле даты, по которому окно ограничивает поиск
+CREATED = "created" # дата создания: полный обход
+PUSHED = "pushed" # дата последнего push: обновление активности
+
+# Доля лимита выдачи, на которую рассчитываются части окна при дроблении:
+# с запасом, чтобы неравномерные части реже приходилось дробить повторно
+FILL_FACTOR = 0.8
+
+
+class Window(NamedTuple):
+    """
+    Временное окно поиска по дате создания (или последнего push) репозитория.
+    Attributes:
+        start (datetime): Начало окна (UTC), включительно.
+        end (datetime): Конец окна (UTC), не включительно.
+        field (str): Поле даты в поисковом запросе: created или pushed.
+    """
+    start: datetime
+    end: datetime
+    field: str = CREATED
+
+
+    @property
+    def query(self) -> str:
+        """Поисковый запрос GitHub для окна. Границы диапазона в поиске включительные."""
+        last = self.end - MIN_WINDOW
+        return (
+            f"fork:false {self.field}:{self.start:%Y-%m-%dT%H:%M:%SZ}..{last:%Y-%m-%dT%H:%M:%SZ}"
+        )
+
+
+    @property
+    def days(self) -> float:
+        """Длина окна в днях."""
+        return (self.end - self.start).total_seconds() / 86400
+
+
+    def split_aligned(self, parts: int) -> list["Window"]:
+        """
+        Делит окно по границам самого крупного шага SPLIT_STEPS, который дает
+        не меньше parts частей. Крайние части короче шага, если границы окна
+        не выровнены по нему.
+        """
+        for step in SPLIT_STEPS:
+            bounds = self.__inner_bounds(step)
+            if len(bounds) + 1 >= parts:
+                break
+        bounds = [self.start, *bounds, self.end]
+        return [Window(bounds[i], bounds[i + 1], self.field) for i in range(len(bounds) - 1)]
+
+
+    def __inner_bounds(self, step: timedelta | relativedelta) -> list[datetime]:
+        """Моменты, кратные шагу (для YEAR и MONTH - начала лет и месяцев), строго внутри окна."""
+        if isinstance(step, relativedelta):
+            month = 1 if step == YEAR else self.start.month
+            bound = datetime(self.start.year, month, 1) + step
+            bounds = []
+            while bound < self.end:
+                bounds.append(bound)
+                bound += step
+            return bounds
+        first = (self.start - EPOCH) // step + 1
+        last = -((EPOCH - self.end) // step) # кратные шагу до end, не включая его
+        return [EPOCH + step * i for i in range(first, last)]
+
+
+class WorkUnit(NamedTuple):
+    """Единица работы краулера: одна страница поиска по одному окну."""
+    window: Window
+    page: int
+
+
+    @property
+    def query(self) -> str:
+        return self.window.query
+
+
+class QueryPlanner:
+    """
+    Планирует поисковые запросы так, чтобы обойти лимит выдачи
+    GitHub (1000 результатов на запрос) минимальным числом запросов.
+
+    Обход начинается с крупных окон (по календарному году): в тихие периоды
+    одно окно на много дней укладывается в одну-две страницы. По total_count
+    первой страницы загруженные окна дробятся на части, пока каждое
+    не уложится в лимит выдачи. Границы окон и частей выровнены по UTC
+    (начала лет, месяцев, кратные шагу моменты), поэтому запросы повторяются
+    от запуска к запуску и к ним подходят ETag прошлых обходов.
+    """
+    def __init__(self, max_repos: int, per_page: int) -> None:
+        self.__max_repos = max_repos
+        self.__per_page = per_page
+
+
+    @staticmethod
+    def initial_units(start: datetime, end: datetime, field: str = CREATED) -> list[WorkUnit]:
+        """
+        Первые страницы окон по полю field, покрывающих промежуток [start, end).
+        Окна разделены началами календарных лет: промежуток режется только по краям.
+        """
+        units = []
+        while start < end:
+            next_start = min(datetime(start.year + 1, 1, 1), end)
+            units.append(WorkUnit(Window(start, next_start, field), 1))
+            start = next_start
+        return units
+
+
+    def plan(self, unit: WorkUnit, total_count: int) -> tuple[bool, list[WorkUnit]]:
+        """
+        Решает, что делать с загруженной страницей.
+        :param unit: Загруженная единица работы
+        :param total_count: Число результатов запроса по данным GitHub
+        :return: Нужно ли сохранять результаты страницы и список новых единиц работы
+        """
+        if unit.page != 1:
+            return True, []
+
+        window = unit.window
+        if total_count > self.__max_repos and window.end - window.start > MIN_WINDOW:
+            # Окно не помещается в лимит выдачи: страница отбрасывается, окно дробится
+            parts = math.ceil(total_count / (self.__max_repos * FILL_FACTOR))
+            return False, [WorkUnit(part, 1) for part in window.split_aligned(parts)]
+
+        pages = math.ceil(min(total_count, self.__max_repos) / self.__per_page)
+        return True, [WorkUnit(window, page) for page in range(2, pages + 1)]
@@ -0,0 +1,154 @@
+import functools
+import hashlib
+import logging
+import os
+import sys
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class QueryCache:
+    """
+    Кеш результатов аналитических запросов: LRU в памяти и, если задан
+    каталог, хранилище DataFrame в Parquet на диске.
+
+    Ключ включает версию данных (счетчик записей в базу), поэтому после
+    записи новых репозиториев старые результаты просто перестают совпадать.
+    Файлы на диске дополнительно помечены namespace - отпечатком базы
+    (см. DataBase.init): версия пересозданной базы снова начинается с 1,
+    а несколько баз могут делить один каталог.
+    Attributes:
+        namespace (str): Отпечаток базы в именах файлов кеша.
+        hits (int): Сколько раз результат найден в памяти.
+        disk_hits (int): Сколько раз результат найден на диске.
+        misses (int): Сколько раз запрос пришлось выполнить.
+    """
+    def __init__(self, max_entries: int = 128, directory: Optional[str] = None) -> None:
+        self.__max_entries = max_entries
+        self.__entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.__directory = directory if directory and self.__parquet_available() else None
+        self.namespace = ""
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.__directory:
+            os.makedirs(self.__directory, exist_ok=True)
+
+
+    @staticmethod
+    def __parquet_available() -> bool:
+        try:
+            import pyarrow # noqa: F401
+        except ImportError:
+            logging.info("pyarrow не установлен, кеш запросов на диске отключен")
+            return False
+        return True
+
+
+    @property
+    def metrics(self) -> dict[str, int]:
+        """Счетчики попаданий и промахов кеша."""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self.__entries),
+        }
+
+
+    def get(self, key: Hashable, version: int) -> Any:
+        """Результат по ключу для версии данных или None."""
+        if (key, version) in self.__entries:
+            self.__entries.move_to_end((key, version))
+            self.hits += 1
+            return self.__copy(self.__entries[(key, version)])
+
+        path = self.__path(key, version)
+        if path is not None and os.path.exists(path):
+            import pandas as pd
+            value = pd.read_parquet(path)
+            self.__remember(key, version, value)
+            self.disk_hits += 1
+            return value.copy()
+
+        self.misses += 1
+        return None
+
+
+    def put(self, key: Hashable, version: int, value: Any) -> None:
+        """Сохраняет результат запроса для версии данных."""
+        self.__remember(key, version, self.__copy(value))
+        path = self.__path(key, version)
+        if path is not None and self.__is_frame(value):
+            self.__evict_files(version)
+            value.to_parquet(path)
+
+
+    def invalidate(self) -> None:
+        """Удаляет все сохраненные результаты."""
+        self.__entries.clear()
+        self.__evict_files(None)
+
+
+    def __remember(self, key: Hashable, version: int, value: Any) -> None:
+        self.__entries[(key, version)] = value
+        self.__entries.move_to_end((key, version))
+        while len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+
+
+    def __path(self, key: Hashable, version: int) -> Optional[str]:
+        if self.__directory is None:
+            return None
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+        return os.path.join(self.__directory, f"{self.namespace}-{version}-{digest}.parquet")
+
+
+    def __evict_files(self, version: Optional[int]) -> None:
+        """Удаляет с диска результаты этой базы для всех версий данных, кроме version."""
+        if self.__directory is None:
+            return
+        for name in os.listdir(self.__directory):
+            if (
+                    name.endswith(".parquet")
+                    and name.startswith(f"{self.namespace}-")
+                    and not name.startswith(f"{self.namespace}-{version}-")
+            ):
+                os.remove(os.path.join(self.__directory, name))
+
+
+    @staticmethod
+    def __is_frame(value: Any) -> bool:
+        # DataFrame не может существовать, пока pandas не импортирован: проверка его не загружает
+        pandas = sys.modules.get("pandas")
+        return pandas is not None and isinstance(value, pandas.DataFrame)
+
+
+    def __copy(self, value: Any) -> Any:
+        # Вызывающий код может менять DataFrame, кеш должен остаться прежним
+        return value.copy() if self.__is_frame(value) else value
+
+
+def cached_query(method):
+    """
+    Кеширует результат метода DataBase по имени метода, аргументам
+    и версии данных (DataBase.data_version). Метод получает сессию
+    с открытой транзакцией, в которой уже прочитана версия: результат
+    запроса сохраняется под версией тех же данных.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        async with self.session() as session:
+            async with session.begin():
+                version = await self.data_version(session)
+                result = self.query_cache.get(key, version)
+                if result is not None:
+                    return result
+                result = await method(self, session, *args, **kwargs)
+                # SQLite (pysqlite) не открывает транзакцию для чтения, и запись между
+                # запросами может сменить версию: такой результат не кешируется
+                if await self.data_version(session) == version:
+                    self.query_cache.put(key, version, result)
+                return result
+    return wrapper
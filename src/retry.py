@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import random
+import time
+
+
+class RetryPolicy:
+    """
+    Экспоненциальная задержка между повторами с полным джиттером:
+    случайная задержка от 0 до base_delay * 2^(attempt-1), но не больше max_delay.
+    Случайность разводит во времени повторы воркеров, упавших одновременно.
+    Attributes:
+        max_attempts (int): Сколько раз пробовать страницу, прежде чем сдаться.
+    """
+    def __init__(
+            self,
+            max_attempts: int = 5,
+            base_delay: float = 1.0,
+            max_delay: float = 60.0,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.__base_delay = base_delay
+        self.__max_delay = max_delay
+
+
+    def delay(self, attempt: int, retry_after: float | None = None, minimum: float = 0.0) -> float:
+        """
+        Задержка перед следующей попыткой.
+        :param attempt: Номер неудачной попытки, начиная с 1
+        :param retry_after: Задержка, которую явно попросил сервер (Retry-After)
+        :param minimum: Нижняя граница задержки, если сервер не указал свою
+        """
+        if retry_after is not None:
+            return retry_after
+        ceiling = min(self.__max_delay, self.__base_delay * 2 ** (attempt - 1))
+        return max(random.uniform(0, ceiling), minimum)
+
+
+class CircuitBreaker:
+    """
+    Общий для всех воркеров предохранитель. После failure_threshold сбоев
+    подряд размыкается на cooldown секунд: все воркеры ждут в wait() и не
+    тратят запросы, пока API деградирует. После паузы первый же сбой снова
+    размыкает его, а успешный запрос сбрасывает счетчик.
+    """
+    def __init__(self, failure_threshold: int = 10, cooldown: float = 30.0) -> None:
+        self.__failure_threshold = failure_threshold
+        self.__cooldown = cooldown
+        self.__failures = 0
+        self.__open_until = 0.0 # по time.monotonic()
+
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self.__open_until
+
+
+    async def wait(self) -> None:
+        """Ждет, пока предохранитель разомкнут."""
+        while (delay := self.__open_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+
+    def record_success(self) -> None:
+        self.__failures = 0
+
+
+    def record_failure(self) -> None:
+        self.__failures += 1
+        if self.__failures >= self.__failure_threshold and not self.is_open:
+            logging.warning(
+                f"API недоступно: {self.__failures} сбоев подряд, "
+                f"пауза всех воркеров на {self.__cooldown} с"
+            )
+            self.__open_until = time.monotonic() + self.__cooldown
+            # Пробный период: следующий сбой разомкнет предохранитель снова
+            self.__failures = self.__failure_threshold - 1
@@ -1,132 +1,421 @@
 import asyncio
 import logging
-from datetime import datetime
+import multiprocessing
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
 
 import tqdm
 from dateutil.relativedelta import relativedelta
 
-from db_manager import DataBase
-from fetcher import ApiRateException, Fetcher
+from crawler import CrawlEngine
+from db_manager import DONE, FAILED, MERGED, REFRESH_WATERMARK, CrawlShard, DataBase
+from etag_cache import ETagCache
+from fetcher import SearchResult
+from metrics import PAGES, ROWS, MetricsExporter
+from planner import CREATED, PUSHED, QueryPlanner, Window, WorkUnit
+from retry import CircuitBreaker, RetryPolicy
 from settings import settings
+from sharding import ShardWorker, merge_shards, prepare_shards
 from token_provider import TokenProvider
+from writer import DbWriter, PageResult
 
 
 max_repos = settings.max_repos
 
 class App:
-    def __init__(self, db: DataBase, fetcher: Fetcher, token_provider: TokenProvider) -> None:
+    """
+    Сбор и обновление репозиториев в базу db. ETag прошлых обходов
+    загружаются из etag_db, если она задана: шард обходится в промежуточную
+    базу, а ETag лежат в основной.
+    """
+    def __init__(
+            self,
+            db: DataBase,
+            token_provider: TokenProvider,
+            etag_db: Optional[DataBase] = None,
+    ) -> None:
         self.__db = db
-        self.__fetcher = fetcher
+        self.__etag_db = etag_db or db
         self.__tqdm: tqdm.tqdm | None = None
-        self.__token_provider = token_provider
+        self.__etag_cache = ETagCache() if settings.conditional_requests else None
+        self.__engine = CrawlEngine(
+            token_provider,
+            self.save_page,
+            workers_per_token=settings.workers_per_token,
+            max_concurrency=settings.max_concurrency,
+            failure_handler=self.fail_page,
+            retry_policy=RetryPolicy(
+                settings.retry_max_attempts, settings.retry_base_delay, settings.retry_max_delay
+            ),
+            breaker=CircuitBreaker(settings.breaker_failure_threshold, settings.breaker_cooldown),
+            etag_cache=self.__etag_cache,
+        )
+        self.__planner = QueryPlanner(max_repos, self.__engine.per_page)
+        self.__writer = DbWriter(db, settings.write_queue_size, settings.db_flush_interval)
+
+
+    async def fetch_and_save_repos(
+            self,
+            since_last_run: bool = False,
+            replay_failed: bool = False,
+            window: Optional[Window] = None,
+    ) -> None:
+        """
+        Сбор репозиториев по годам.
+        Сначала дообрабатываются единицы работы, не завершенные прошлым запуском.
+        :param since_last_run: Загрузить только окна новее последнего завершенного
+        :param replay_failed: Только повторить неудачные и незавершенные страницы
+        :param window: Обойти этот промежуток дат создания, а не последние fetch_years лет
+        """
+        window = window or crawl_range()
+        start_date, end_date = window.start, window.end
+
+        units = await self.__unfinished_units(CREATED, include_failed=replay_failed)
+        if units:
+            logging.info(f"Продолжение прошлого обхода: {len(units)} незавершенных страниц")
+
+        if since_last_run:
+            start_date = await self.__db.last_completed_window_end() or start_date
+            units += self.__planner.initial_units(start_date, end_date)
+        elif not units and not replay_failed:
+            failed = await self.__db.count_failed_crawl_units()
+            if failed:
+                logging.warning(
+                    f"Новый полный обход: {failed} неудачных страниц прошлого обхода "
+                    f"будут загружены в его составе"
+                )
+            await self.__db.reset_crawl_units()
+            units = self.__planner.initial_units(start_date, end_date)
+        await self.__crawl(units)
 
+        if not await self.__db.get_unfinished_crawl_units(field=CREATED):
+            # Журнал завершенного обхода - весь его план: ETag других запросов не пригодятся
+            pruned = await self.__db.prune_page_etags()
+            if pruned:
+                logging.info(f"Удалено {pruned} ETag запросов, которых нет в плане обхода")
 
-    def __get_request_count(self) -> int:
-        """Количество страниц запроса"""
-        per_page = self.__fetcher.per_page
-        if max_repos % per_page == 0:
-            return max_repos // per_page
-        else:
-            return max_repos // per_page + 1
 
+    async def refresh_activity(self) -> None:
+        """
+        Обновление активности без полного обхода: ищет репозитории, в которые
+        был push после прошлого обновления (окна pushed: от отметки до текущего
+        момента, дробятся так же, как окна обхода), и записывает только их.
+        В базу попадают и новые репозитории с push.
+
+        Отметка сдвигается, только когда все страницы обновления загружены.
+        Прерванное обновление продолжается с незавершенных страниц, а новые
+        окна начинаются с конца уже запланированных. Без отметки обновление
+        начинается с загрузки первой страницы последнего полного обхода.
+        """
+        # Окна поиска в UTC и с точностью поиска до секунды
+        now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        watermark = await self.__db.get_meta(REFRESH_WATERMARK)
+        if watermark is not None:
+            since = datetime.fromisoformat(watermark)
+        else:
+            fetched_at = await self.__db.first_fetched_at() # локальное время
+            if fetched_at is None:
+                logging.error("Обновлять нечего: сначала нужен полный обход (save)")
+                return
+            since = fetched_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+        units = await self.__unfinished_units(PUSHED, include_failed=True)
+        start = max(since, await self.__db.last_window_end(PUSHED) or since)
+        logging.info(
+            f"Обновление активности с {start:%Y-%m-%d %H:%M:%S} UTC, "
+            f"незавершенных страниц прошлого обновления: {len(units)}"
+        )
+        await self.__crawl(units + self.__planner.initial_units(start, now, PUSHED))
+
+        if await self.__db.get_unfinished_crawl_units(include_failed=True, field=PUSHED):
+            logging.warning("Не все страницы обновления загружены, отметка не сдвигается")
+        else:
+            await self.__db.set_meta(REFRESH_WATERMARK, now.isoformat())
 
-    @staticmethod
-    def __get_query(date: datetime) -> str:
-        date_str = date.strftime("%Y-%m-%d")
-        return f"fork:false created:{date_str}"
 
+    async def __unfinished_units(self, field: str, include_failed: bool) -> list[WorkUnit]:
+        """Незавершенные единицы работы журнала по окнам поля field."""
+        return [
+            WorkUnit(Window(unit.window_start, unit.window_end, unit.field), unit.page)
+            for unit in await self.__db.get_unfinished_crawl_units(include_failed, field)
+        ]
 
-    async def search_and_save(self, query: str) -> None:
-        """Функция проходится по всем страницам для одного запроса"""
-        for page in range(1, self.__get_request_count() + 1):
-            await self.search_and_save_page(query, page)
 
+    async def __crawl(self, units: list[WorkUnit]) -> None:
+        """Записывает единицы работы в журнал и обходит их вместе с дочерними."""
+        if self.__etag_cache is not None:
+            await self.__etag_cache.load(self.__etag_db)
+            logging.info(f"Условные запросы: известно {len(self.__etag_cache)} ETag страниц")
+        await self.__db.add_crawl_units([self.__to_ledger(unit) for unit in units])
+        await self.__db.flush()
 
-    async def search_and_save_by_day(self, date: datetime) -> None:
-        """
-        Функция проходится по всем дням за месяц и
-        собирает репозитории, созданные в эти дни
-        """
-        end_date = date + relativedelta(months=1)
-        while date < end_date:
-            query = self.__get_query(date)
-            await self.search_and_save(query)
-            self.__tqdm.update(1)
-            date = date + relativedelta(days=1)
-
-
-    async def fetch_and_save_repos(self) -> None:
-        """Сбор репозиториев по годам"""
-        tasks = []
-        end_date = datetime.now()
-        current_date = end_date - relativedelta(years=settings.fetch_years) # дата старта
-        total_steps = (end_date - current_date).days # число дней в промежутке
+        total_steps = sum(unit.window.days for unit in units if unit.page == 1) # число дней
         self.__tqdm = tqdm.tqdm(total=total_steps, desc='Fetching')
-        while current_date < end_date:
-            next_date = current_date + relativedelta(months=1)
-            tasks.append(self.search_and_save_by_day(next_date))
-            current_date = next_date
-        await asyncio.gather(*tasks)
+        self.__writer.start()
+        try:
+            await self.__engine.run(units)
+        finally:
+            await self.__writer.close()
         self.__tqdm.close()
 
 
-    async def search_and_save_page(self, query: str, page: int) -> None:
-        while True:
-            try:
-                logging.info(f"Токен доступа: {self.__fetcher.token.value}")
-                infos = await self.__fetcher.fetch_repos_page(page, query) # тянем одну страницу из GitHub
-                await self.__db.add_repo_info(infos) # сохраняем все репозитории этой страницы в базу
+    @staticmethod
+    def __to_ledger(unit: WorkUnit) -> tuple[str, int, datetime, datetime, str]:
+        return unit.query, unit.page, unit.window.start, unit.window.end, unit.window.field
 
-                if settings.debug:
-                    counter = 1
-                    for info in infos:
-                        logging.info(f"{page}:{counter} Сохранен репозиторий {info}")
-                        counter += 1
 
-            except ApiRateException:
-                logging.error(
-                    f"Достигнут лимит запросов на странице {page}. Получение нового токена и перезапуск"
+    async def save_page(self, unit: WorkUnit, result: SearchResult) -> None:
+        """
+        Планирует по total_count следующие запросы окна
+        и передает репозитории загруженной страницы на запись в базу
+        """
+        keep, next_units = self.__planner.plan(unit, result.total_count)
+        for next_unit in next_units:
+            self.__engine.put(next_unit)
+
+        infos = []
+        if keep:
+            if unit.page == 1 and result.total_count > max_repos:
+                logging.warning(
+                    f"Окно {unit.query} нельзя раздробить: "
+                    f"будет загружено {max_repos} из {result.total_count}"
                 )
-                self.__fetcher.token.expired_at = datetime.now()
-                self.__fetcher.token = await self.__token_provider.get_token()
-                logging.error(f"Токен обновлен: {self.__fetcher.token.value}")
-                continue
-
-            except Exception as e:
-                logging.error(f"Ошибка обработки страницы {page}, {e}")
-
-            break
-
-
-async def main() -> None:
+            infos = result.items
+            if result.not_modified:
+                logging.info(f"Страница {unit.page} окна {unit.query} не изменилась")
+
+            if settings.debug:
+                counter = 1
+                for info in infos:
+                    logging.info(f"{unit.page}:{counter} Загружен репозиторий {info}")
+                    counter += 1
+        else:
+            logging.info(f"Окно {unit.query}: {result.total_count} результатов, дробление")
+
+        # Новые единицы попадают в журнал в той же транзакции, что и отметка
+        # о выполнении текущей, чтобы после падения обход продолжился с них
+        await self.__writer.put(
+            PageResult(
+                infos,
+                unit.query,
+                unit.page,
+                DONE,
+                result.total_count,
+                tuple(self.__to_ledger(next_unit) for next_unit in next_units),
+                etag=None if result.not_modified else result.etag,
+            )
+        )
+        PAGES.inc("not_modified" if result.not_modified else "done")
+        ROWS.inc(amount=len(infos))
+        if self.__etag_cache is not None and result.etag and not result.not_modified:
+            self.__etag_cache.put(unit.query, unit.page, result.etag, result.total_count)
+        if keep and unit.page == 1:
+            self.__tqdm.update(unit.window.days)
+
+
+    async def fail_page(self, unit: WorkUnit, error: Exception, attempts: int) -> None:
+        """Отмечает страницу в журнале как неудачную: ее повторит запуск с --replay-failed"""
+        await self.__writer.put(
+            PageResult([], unit.query, unit.page, FAILED, attempts=attempts, error=repr(error)[:500])
+        )
+
+
+def crawl_range() -> Window:
+    """
+    Промежуток полного обхода: последние fetch_years лет (UTC, как окна поиска)
+    с начала месяца, чтобы первое окно повторялось в запусках одного месяца.
+    """
+    end_date = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    start_date = end_date - relativedelta(years=settings.fetch_years)
+    return Window(datetime(start_date.year, start_date.month, 1), end_date)
+
+
+@contextmanager
+def profiler(kind: Optional[str]) -> Iterator[None]:
+    """
+    Профилирует весь обход: cProfile пишет profile.prof, pyinstrument - profile.html.
+    Время fetch_repos_page, разбора и записи в базу видно в профиле по вызовам.
+    """
+    if kind is None:
+        yield
+    elif kind == "cprofile":
+        import cProfile
+        with cProfile.Profile() as profile:
+            yield
+        profile.dump_stats("profile.prof")
+    else:
+        from pyinstrument import Profiler
+        profile = Profiler(async_mode="enabled")
+        with profile:
+            yield
+        profile.write_html("profile.html")
+
+
+def setup_logging(filename: str = "app_log.log") -> None:
     logging.basicConfig(
         level=logging.INFO,
-        filename="app_log.log",
+        filename=filename,
         filemode="w",
         encoding="utf-8",
         format="%(asctime)s%(levelname)s %(message)s",
     )
-    db = DataBase(settings.db_url)
-    await db.init()
-
-    token_provider = TokenProvider(settings.path_to_tokens)
-    fetcher = Fetcher(await token_provider.get_token())
-
-    app = App(db, fetcher, token_provider)
-    await app.fetch_and_save_repos()
-
-
-if __name__ == "__main__":
-    asyncio.run(main())
-
-
-
 
 
+async def crawl_shard(
+        token_provider: TokenProvider,
+        shard: CrawlShard,
+        staging: DataBase,
+        db: DataBase,
+) -> None:
+    """
+    Обходит окно шарда в его промежуточную базу. Журнал обхода ведется
+    в ней же, поэтому шард, прерванный вместе с воркером, продолжается
+    с места остановки, а неудачные страницы повторяются. ETag прошлых
+    обходов берутся из основной базы db. Если журнал
+    завершен (воркер упал после обхода, но до отметки о шарде), шард
+    не обходится заново.
+    """
+    unfinished = await staging.get_unfinished_crawl_units(include_failed=True, field=CREATED)
+    if not unfinished and await staging.last_window_end(CREATED) is not None:
+        logging.info(f"Шард {shard.id} уже обойден, повторный обход не нужен")
+        return
+    replay_failed = any(unit.status == FAILED for unit in unfinished)
+    app = App(staging, token_provider, etag_db=db)
+    await app.fetch_and_save_repos(
+        replay_failed=replay_failed, window=Window(shard.window_start, shard.window_end)
+    )
 
 
+async def run_worker(slot: int = 0, slots: int = 1) -> int:
+    """
+    Воркер распределенного обхода: берет шарды из общей базы DB_URL, пока они есть.
+    :param slot: Номер воркера среди slots: воркер получает свою долю токенов
+    :return: Сколько шардов обработано
+    """
+    db = DataBase(settings.db_url)
+    await db.init()
+    token_provider = TokenProvider(settings.path_to_tokens, slot, slots)
+    exporter = MetricsExporter(
+        port=settings.metrics_port + 1 + slot if settings.metrics_port is not None else None,
+        snapshot_path=(
+            f"{settings.metrics_snapshot_path}.worker{slot}"
+            if settings.metrics_snapshot_path is not None else None
+        ),
+        interval=settings.metrics_interval,
+    )
+    await exporter.start()
+    worker = ShardWorker(
+        db,
+        lambda shard, staging: crawl_shard(token_provider, shard, staging, db),
+        settings.shard_lease_seconds,
+    )
+    try:
+        return await worker.run()
+    finally:
+        await exporter.close()
+        await db.close()
+
+
+def worker_process(slot: int, slots: int) -> None:
+    """Точка входа процесса-воркера, запущенного координатором."""
+    setup_logging(f"app_log.worker{slot}.log")
+    asyncio.run(run_worker(slot, slots))
+
+
+async def crawl_sharded(db: DataBase, shards: int, processes: int) -> int:
+    """
+    Координатор распределенного обхода: делит промежуток обхода на шарды,
+    запускает processes процессов-воркеров с непересекающимися наборами
+    токенов и, когда они закончат, переносит шарды в основную базу.
+    Воркеры на других машинах подключаются к той же базе командой save --worker.
+    :return: Сколько строк перенесено в основную базу
+    """
+    tokens = len(TokenProvider(settings.path_to_tokens).tokens)
+    if processes > tokens:
+        logging.warning(f"Процессов больше, чем токенов: запускается {tokens}")
+        processes = tokens
+    window = crawl_range()
+    await prepare_shards(db, window.start, window.end, shards)
+
+    context = multiprocessing.get_context("spawn") # без копии event loop и соединений родителя
+    workers = [
+        context.Process(target=worker_process, args=(slot, processes)) for slot in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        await asyncio.to_thread(worker.join)
+        if worker.exitcode != 0:
+            logging.error(f"Воркер {worker.name} завершился с кодом {worker.exitcode}")
+
+    failed = await db.get_crawl_shards(FAILED)
+    if failed:
+        logging.warning(f"Неудачных шардов: {len(failed)}, их повторит следующий запуск с --shards")
+    merged = await merge_shards(db, settings.db_batch_size)
+    if all(shard.status == MERGED for shard in await db.get_crawl_shards()):
+        # Журнал перенесен целиком: это весь план обхода
+        await db.prune_page_etags()
+    return merged
+
+
+async def main(
+        since_last_run: bool = False,
+        replay_failed: bool = False,
+        profile: Optional[str] = None,
+        refresh: bool = False,
+) -> None:
+    setup_logging()
+    db = DataBase(settings.db_url)
+    await db.init()
 
+    token_provider = TokenProvider(settings.path_to_tokens)
+    exporter = MetricsExporter(
+        port=settings.metrics_port,
+        snapshot_path=settings.metrics_snapshot_path,
+        interval=settings.metrics_interval,
+    )
+    await exporter.start()
+
+    app = App(db, token_provider)
+    try:
+        with profiler(profile):
+            if refresh:
+                await app.refresh_activity()
+            else:
+                await app.fetch_and_save_repos(since_last_run, replay_failed)
+    finally:
+        await exporter.close()
+        await db.close()
+
+
+async def main_sharded(
+        shards: Optional[int] = None,
+        processes: int = 1,
+        worker: bool = False,
+        slot: int = 0,
+        slots: int = 1,
+) -> None:
+    """Распределенный обход: координатор (shards), отдельный воркер или только перенос шардов."""
+    setup_logging(f"app_log.worker{slot}.log" if worker else "app_log.log")
+    if worker:
+        await run_worker(slot, slots)
+        return
 
+    db = DataBase(settings.db_url)
+    await db.init()
+    try:
+        if shards is not None:
+            merged = await crawl_sharded(db, shards, processes)
+        else:
+            merged = await merge_shards(db, settings.db_batch_size)
+        logging.info(f"В основную базу перенесено строк: {merged}")
+    finally:
+        await db.close()
 
 
+if __name__ == "__main__":
+    from cli import run # аргументы всех команд описаны в cli.py
 
+    run(["save", *sys.argv[1:]])
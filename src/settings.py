@@ -8,6 +8,30 @@ class Settings(BaseSettings):
     path_to_tokens: str
     max_repos: int = 1000
     fetch_years: int = 18
+    workers_per_token: int = 2 # воркеров на один токен
+    max_concurrency: int = 10 # одновременных запросов к API на весь краулер
+    db_batch_size: int = 5000 # строк в одной транзакции записи в базу
+    db_flush_interval: float = 1.0 # секунд простоя, после которых накопленное пишется в базу
+    write_queue_size: int = 100 # страниц в очереди на запись, дальше фетчеры ждут
+    api_url: str = "https://api.github.com"
+    http_max_connections: int = 4 # соединений в пуле токена, общем для его воркеров
+    http_keepalive_expiry: float = 30.0 # секунд жизни простаивающего соединения
+    http2: bool = True # мультиплексирование запросов (нужен пакет h2)
+    http_connect_timeout: float = 10.0
+    http_read_timeout: float = 30.0
+    retry_max_attempts: int = 5 # попыток загрузить страницу при временных сбоях и отказах по лимитам
+    retry_base_delay: float = 1.0 # секунд до первого повтора, дальше вдвое больше
+    retry_max_delay: float = 60.0 # предел задержки между повторами
+    breaker_failure_threshold: int = 10 # сбоев подряд, после которых встают все воркеры
+    breaker_cooldown: float = 30.0 # секунд паузы всех воркеров
+    conditional_requests: bool = True # If-None-Match по ETag прошлых обходов
+    shard_staging_url: str = "sqlite+aiosqlite:///./staging/shard-{shard}.db" # база шарда
+    shard_lease_seconds: float = 300.0 # аренда шарда, продлевается каждую треть срока
+    metrics_port: int | None = None # порт /metrics в формате Prometheus на 127.0.0.1
+    metrics_snapshot_path: str | None = None # файл периодического JSON-снимка метрик
+    metrics_interval: float = 10.0 # секунд между снимками метрик
+    query_cache_size: int = 128 # результатов аналитических запросов в памяти
+    query_cache_dir: str | None = None # каталог кеша запросов на диске (нужен pyarrow)
     active_after: str = "2024-01-01" # Дата, после которой у репозитория есть коммиты
     model_config = SettingsConfigDict(env_file='../.env')
 
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy.engine import make_url
+
+from db_manager import DONE, FAILED, LEASED, MERGED, CrawlShard, DataBase, RepoRecord
+from planner import Window
+from settings import settings
+
+
+# Обход шарда: получает шард и его промежуточную базу
+ShardHandler = Callable[[CrawlShard, DataBase], Awaitable[None]]
+
+# Как часто воркер без работы проверяет, не истекла ли чужая аренда, секунд
+SHARD_POLL_INTERVAL = 1.0
+
+
+def staging_url(shard_id: int) -> str:
+    """Адрес промежуточной базы шарда по шаблону SHARD_STAGING_URL."""
+    return settings.shard_staging_url.format(shard=shard_id)
+
+
+def staging_path(url: str) -> Optional[str]:
+    """Файл промежуточной базы SQLite или None для других движков."""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.database
+
+
+async def prepare_shards(db: DataBase, start: datetime, end: datetime, count: int) -> list[CrawlShard]:
+    """
+    Делит промежуток [start, end) не меньше чем на count шардов по границам
+    Window.split_aligned: они совпадают с границами окон планировщика, поэтому
+    повторный обход шарда повторяет его запросы и получает 304 по ETag.
+    Если прошлый распределенный обход не перенесен в основную базу целиком,
+    продолжает его: неудачные шарды возвращаются в очередь, новые не создаются.
+    Репозиториев в последние годы больше, поэтому шардов стоит делать
+    в несколько раз больше, чем воркеров: свободный воркер берет следующий.
+    """
+    shards = await db.get_crawl_shards()
+    if any(shard.status != MERGED for shard in shards):
+        retried = await db.retry_failed_crawl_shards()
+        logging.info(f"Продолжение распределенного обхода: {len(shards)} шардов, {retried} повторно")
+        return await db.get_crawl_shards()
+
+    window = Window(start, end)
+    windows = window.split_aligned(count) if count > 1 else [window]
+    # Журнал основной базы соберется из журналов шардов при переносе
+    await db.reset_crawl_units()
+    await db.reset_crawl_shards([(part.start, part.end) for part in windows])
+    logging.info(f"Распределенный обход: {len(windows)} шардов")
+    return await db.get_crawl_shards()
+
+
+class ShardWorker:
+    """
+    Воркер распределенного обхода. Берет шарды в аренду в таблице CrawlShard
+    общей базы, обходит каждый handler'ом в свою промежуточную базу и,
+    пока обход идет, продлевает аренду. Если аренду перехватил другой воркер
+    (эта истекла), обход шарда прерывается.
+
+    Воркер завершается, когда не осталось ни свободных шардов, ни чужих
+    аренд: аренда упавшего воркера истечет, и шард достанется живому.
+    """
+    def __init__(
+            self,
+            db: DataBase,
+            handler: ShardHandler,
+            lease_seconds: float,
+            worker_id: Optional[str] = None,
+    ) -> None:
+        self.__db = db
+        self.__handler = handler
+        self.__lease = timedelta(seconds=lease_seconds)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+
+    async def run(self) -> int:
+        """Обходит шарды, пока они есть. :return: Сколько шардов обработано"""
+        processed = 0
+        while True:
+            shard = await self.__db.lease_crawl_shard(self.worker_id, self.__lease)
+            if shard is None:
+                if not await self.__db.get_crawl_shards(LEASED):
+                    return processed
+                await asyncio.sleep(SHARD_POLL_INTERVAL)
+                continue
+            logging.info(
+                f"Воркер {self.worker_id}: шард {shard.id} "
+                f"({shard.window_start:%Y-%m-%d}..{shard.window_end:%Y-%m-%d})"
+            )
+            await self.__process(shard)
+            processed += 1
+
+
+    async def __process(self, shard: CrawlShard) -> None:
+        staging = DataBase(staging_url(shard.id))
+        path = staging_path(staging_url(shard.id))
+        if path is not None and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        await staging.init()
+
+        crawl = asyncio.create_task(self.__handler(shard, staging))
+        heartbeat = asyncio.create_task(self.__heartbeat(shard))
+        try:
+            await asyncio.wait([crawl, heartbeat], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            crawl.cancel()
+            heartbeat.cancel()
+            await asyncio.gather(crawl, heartbeat, return_exceptions=True)
+
+        try:
+            if crawl.cancelled():
+                logging.warning(f"Аренда шарда {shard.id} перехвачена, обход прерван")
+                return
+            if crawl.exception() is not None:
+                logging.error(f"Ошибка обхода шарда {shard.id}, {crawl.exception()!r}")
+                status, error = FAILED, repr(crawl.exception())[:500]
+            elif failed := await staging.count_failed_crawl_units():
+                status, error = FAILED, f"не загружено страниц: {failed}"
+            else:
+                status, error = DONE, None
+        finally:
+            await staging.close()
+
+        if not await self.__db.finish_crawl_shard(shard.id, status, self.worker_id, error):
+            logging.warning(f"Аренда шарда {shard.id} истекла до завершения обхода")
+
+
+    async def __heartbeat(self, shard: CrawlShard) -> None:
+        """
+        Продлевает аренду, пока она принадлежит этому воркеру. Ошибка продления
+        (например, база недоступна) не прерывает обход: следующая попытка -
+        через тот же интервал, а аренда проживет еще две трети срока.
+        Завершается, только когда аренду забрал другой воркер.
+        """
+        while True:
+            await asyncio.sleep(self.__lease.total_seconds() / 3)
+            try:
+                renewed = await self.__db.renew_crawl_shard(shard.id, self.worker_id, self.__lease)
+            except Exception as e:
+                logging.warning(f"Не удалось продлить аренду шарда {shard.id}, {e!r}")
+                continue
+            if not renewed:
+                return
+
+
+async def merge_shards(db: DataBase, chunk_size: int) -> int:
+    """
+    Переносит репозитории обойденных шардов в основную базу (upsert по id,
+    поэтому повторный перенос после сбоя безопасен), а с ними журнал
+    обхода и ETag: по журналу основной базы работают обновление активности
+    и --since-last-run. Промежуточные базы SQLite удаляются.
+    :return: Сколько строк перенесено
+    """
+    merged = 0
+    for shard in await db.get_crawl_shards(DONE):
+        url = staging_url(shard.id)
+        staging = DataBase(url)
+        await staging.init()
+        try:
+            async for rows in staging.stream_repo_rows(chunk_size):
+                await db.add_repo_info([RepoRecord(*row[:5]) for row in rows])
+                merged += len(rows)
+            await db.flush()
+            await db.import_crawl_journal(
+                await staging.get_crawl_units(DONE), await staging.get_page_etags()
+            )
+        finally:
+            await staging.close()
+        await db.finish_crawl_shard(shard.id, MERGED)
+
+        path = staging_path(url)
+        for suffix in ("", "-wal", "-shm"):
+            if path is not None and os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        logging.info(f"Шард {shard.id} перенесен в основную базу")
+    return merged
@@ -0,0 +1,186 @@
+"""
+Потоковые оценки с постоянной памятью: данные подаются частями, в памяти
+остается только сама оценка. Оценки одного вида объединяются (merge),
+поэтому части таблицы, выгрузки или шарды можно считать отдельно.
+"""
+import math
+from typing import Hashable, Mapping, Optional
+
+import numpy as np
+
+
+class SpaceSaving:
+    """
+    Частые элементы (heavy hitters) алгоритмом Space-Saving: не больше
+    capacity счетчиков. Счет элемента завышен не больше чем на его error,
+    а элемент с долей больше 1/capacity гарантированно есть в счетчиках.
+    """
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.__counts: dict[Hashable, int] = {}
+        self.__errors: dict[Hashable, int] = {}
+
+
+    def update(self, item: Hashable, weight: int = 1) -> None:
+        counts = self.__counts
+        if item in counts:
+            counts[item] += weight
+        elif len(counts) < self.capacity:
+            counts[item] = weight
+            self.__errors[item] = 0
+        else:
+            # Новый элемент вытесняет наименьший счетчик и наследует его счет как погрешность
+            victim = min(counts, key=counts.__getitem__)
+            floor = counts.pop(victim)
+            del self.__errors[victim]
+            counts[item] = floor + weight
+            self.__errors[item] = floor
+
+
+    def update_counts(self, counts: Mapping[Hashable, int]) -> None:
+        """Добавляет точные счетчики части данных, крупные первыми: так меньше вытеснений."""
+        for item, weight in sorted(counts.items(), key=lambda pair: pair[1], reverse=True):
+            self.update(item, weight)
+
+
+    def __floor(self) -> int:
+        # Счет любого элемента, которого нет в заполненных счетчиках, не больше минимального
+        if len(self.__counts) < self.capacity:
+            return 0
+        return min(self.__counts.values())
+
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """Объединяет с оценкой по другой части данных (Agarwal et al., Mergeable Summaries)."""
+        own_floor, other_floor = self.__floor(), other.__floor()
+        counts, errors = {}, {}
+        for item in self.__counts.keys() | other.__counts.keys():
+            counts[item] = self.__counts.get(item, own_floor) + other.__counts.get(item, other_floor)
+            errors[item] = self.__errors.get(item, own_floor) + other.__errors.get(item, other_floor)
+        kept = sorted(counts, key=counts.__getitem__, reverse=True)[:self.capacity]
+        self.__counts = {item: counts[item] for item in kept}
+        self.__errors = {item: errors[item] for item in kept}
+
+
+    def top(self, n: Optional[int] = None) -> list[tuple[Hashable, int, int]]:
+        """:return: До n пар (элемент, оценка счета, погрешность) по убыванию счета"""
+        items = sorted(self.__counts, key=self.__counts.__getitem__, reverse=True)[:n]
+        return [(item, self.__counts[item], self.__errors[item]) for item in items]
+
+
+class TDigest:
+    """
+    Квантили t-digest (Dunning): значения сжимаются в центроиды так, что
+    у краев распределения центроиды мельче, поэтому p99 точнее p50.
+    Центроидов около compression / 2; новые значения копятся в буфере
+    и сливаются с центроидами одной сортировкой NumPy.
+    """
+    def __init__(self, compression: float = 200, buffer_size: int = 100_000) -> None:
+        self.compression = compression
+        self.__buffer_size = buffer_size
+        self.__means = np.empty(0)
+        self.__weights = np.empty(0)
+        self.__buffer: list[tuple[np.ndarray, np.ndarray]] = []
+        self.__buffered = 0
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+
+    def update(self, values: np.ndarray, weights: Optional[np.ndarray] = None) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        weights = np.ones(values.size) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.__buffer.append((values, weights))
+        self.__buffered += values.size
+        self.count += float(weights.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if self.__buffered >= self.__buffer_size:
+            self.__compress()
+
+
+    def merge(self, other: "TDigest") -> None:
+        """Объединяет с оценкой по другой части данных."""
+        other.__compress()
+        if other.count:
+            self.update(other.__means, other.__weights)
+            # update взял min и max по центроидам, а не по исходным значениям
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+
+
+    def __compress(self) -> None:
+        if not self.__buffer:
+            return
+        means = np.concatenate([self.__means, *(values for values, _ in self.__buffer)])
+        weights = np.concatenate([self.__weights, *(weights for _, weights in self.__buffer)])
+        self.__buffer, self.__buffered = [], 0
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        # Шкала k1: центроид покрывает не больше единицы k = compression / 2pi * asin(2q - 1),
+        # поэтому у q около 0 и 1 центроиды мельче
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+        _, centroid = np.unique(np.floor(k), return_inverse=True)
+        self.__weights = np.bincount(centroid, weights)
+        self.__means = np.bincount(centroid, weights * means) / self.__weights
+
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля q (0..1): интерполяция между центрами центроидов."""
+        self.__compress()
+        if not self.count:
+            return math.nan
+        centers = np.cumsum(self.__weights) - self.__weights / 2
+        return float(np.interp(
+            q * self.count,
+            np.concatenate([[0], centers, [self.count]]),
+            np.concatenate([[self.min], self.__means, [self.max]]),
+        ))
+
+
+class HyperLogLog:
+    """
+    Оценка числа различных элементов HyperLogLog: 2 ** precision регистров
+    по байту (16 КБ при precision=14), стандартная ошибка 1.04 / sqrt(2 ** precision).
+    Хеши - pandas.util.hash_array с фиксированным ключом, одинаковые во всех
+    процессах, поэтому оценки из разных процессов объединяются.
+    """
+    def __init__(self, precision: int = 14) -> None:
+        self.precision = precision
+        self.__registers = np.zeros(1 << precision, np.uint8)
+
+
+    def update(self, values: np.ndarray) -> None:
+        import pandas as pd # хеш строк векторно
+
+        self.update_hashes(pd.util.hash_array(np.asarray(values, dtype=object)))
+
+
+    def update_hashes(self, hashes: np.ndarray) -> None:
+        """Добавляет элементы по их 64-битным хешам (np.uint64)."""
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Ранг - позиция старшей единицы в оставшихся битах; frexp дает длину числа в битах,
+        # а bits <= 53 помещаются в float64 без округления
+        _, length = np.frexp(rest.astype(np.float64))
+        np.maximum.at(self.__registers, index, (bits + 1 - length).astype(np.uint8))
+
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.__registers, other.__registers, out=self.__registers)
+
+
+    def estimate(self) -> float:
+        m = self.__registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.__registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.__registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros) # линейный подсчет для малых множеств
+        return raw
@@ -0,0 +1,205 @@
+from collections import Counter
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from db_manager import DataBase, RepoInfo, epoch
+from numpy_analytics import to_years
+from sketches import HyperLogLog, SpaceSaving, TDigest
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+SECONDS_PER_DAY = 86400
+QUANTILES = (0.5, 0.75, 0.9, 0.99)
+
+
+class StreamingReport:
+    """
+    Отчеты по сырой таблице репозиториев за один проход с постоянной памятью:
+    годы создания и последнего коммита - точные счетчики, частые языки -
+    Space-Saving, время жизни (от создания до последнего коммита) - t-digest,
+    число владельцев - HyperLogLog. Память не зависит от числа строк.
+
+    Строки подаются частями (update); отчеты по частям таблицы, выгрузки
+    или шардам объединяются через merge. Годовые отчеты совпадают
+    с аналитическими методами DataBase.
+    """
+    def __init__(
+            self,
+            active_after: datetime,
+            language_capacity: int = 50,
+            compression: float = 200,
+            precision: int = 14,
+    ) -> None:
+        self.__active_after = int(pd.Timestamp(active_after).timestamp())
+        self.rows = 0
+        self.__created = Counter()
+        self.__pushed = Counter()
+        self.__active_created = Counter()
+        self.__languages = SpaceSaving(language_capacity)
+        self.__lifespans = TDigest(compression)
+        self.__owners = HyperLogLog(precision)
+
+
+    @classmethod
+    async def from_database(
+            cls,
+            db: DataBase,
+            active_after: datetime,
+            chunk_size: int = 100_000,
+            arrow: bool = False,
+            **options,
+    ) -> "StreamingReport":
+        """
+        Один проход по таблице репозиториев частями по chunk_size строк.
+        :param arrow: Читать пакетами Arrow (stream_repo_batches), а не строками
+        """
+        report = cls(active_after, **options)
+        if arrow:
+            async for batch in db.stream_repo_batches(chunk_size):
+                report.update_batch(batch)
+            return report
+
+        columns = [
+            epoch(RepoInfo.created_at), epoch(RepoInfo.pushed_at), RepoInfo.language, RepoInfo.full_name
+        ]
+        async for rows in db.stream_repo_rows(chunk_size, columns):
+            created_at, pushed_at, languages, full_names = zip(*rows)
+            report.update(
+                np.fromiter(created_at, np.int64, len(rows)),
+                np.fromiter(pushed_at, np.int64, len(rows)),
+                languages,
+                full_names,
+            )
+        return report
+
+
+    @classmethod
+    def from_parquet(
+            cls,
+            directory: str,
+            active_after: datetime,
+            batch_size: int = 1_000_000,
+            **options,
+    ) -> "StreamingReport":
+        """Один проход по выгрузке export_data.py пакетами по batch_size строк."""
+        import pyarrow.dataset as ds
+
+        report = cls(active_after, **options)
+        dataset = ds.dataset(directory, format="parquet", partitioning="hive")
+        for batch in dataset.to_batches(
+                columns=["full_name", "language", "created_at", "pushed_at"], batch_size=batch_size
+        ):
+            report.update_batch(batch)
+        return report
+
+
+    def update(
+            self,
+            created_at: np.ndarray,
+            pushed_at: np.ndarray,
+            languages: Sequence[Optional[str]],
+            full_names: Sequence[str],
+    ) -> None:
+        """
+        Добавляет часть строк.
+        :param created_at: Даты создания в секундах от эпохи (UTC)
+        :param pushed_at: Даты последнего коммита в секундах от эпохи (UTC)
+        :param languages: Языки, None - язык не определен
+        :param full_names: Имена owner/repo
+        """
+        created_year = to_years(created_at)
+        self.__count_years(self.__created, created_year)
+        self.__count_years(self.__pushed, to_years(pushed_at))
+        self.__count_years(self.__active_created, created_year[pushed_at > self.__active_after])
+
+        language_counts = Counter(languages)
+        language_counts.pop(None, None)
+        self.__languages.update_counts(language_counts)
+
+        self.__lifespans.update(np.clip(pushed_at - created_at, 0, None) / SECONDS_PER_DAY)
+        self.__owners.update([name.partition("/")[0] for name in full_names])
+        self.rows += len(created_at)
+
+
+    def update_batch(self, batch: "pa.RecordBatch") -> None:
+        """Добавляет пакет Arrow со столбцами схемы выгрузки (export_data.SCHEMA)."""
+        self.update(
+            batch.column("created_at").to_numpy(),
+            batch.column("pushed_at").to_numpy(),
+            batch.column("language").to_pylist(),
+            batch.column("full_name").to_pylist(),
+        )
+
+
+    def merge(self, other: "StreamingReport") -> None:
+        """Объединяет с отчетом по другой части данных (та же active_after)."""
+        self.rows += other.rows
+        self.__created.update(other.__created)
+        self.__pushed.update(other.__pushed)
+        self.__active_created.update(other.__active_created)
+        self.__languages.merge(other.__languages)
+        self.__lifespans.merge(other.__lifespans)
+        self.__owners.merge(other.__owners)
+
+
+    @staticmethod
+    def __count_years(counter: Counter, years: np.ndarray) -> None:
+        values, counts = np.unique(years, return_counts=True)
+        counter.update(dict(zip(values.tolist(), counts.tolist())))
+
+
+    @staticmethod
+    def __year_frame(counter: Counter) -> pd.DataFrame:
+        if not counter:
+            return pd.DataFrame([], columns=["year", "count"]).set_index("year") # как у DataBase
+        years = sorted(counter)
+        return pd.DataFrame(
+            {"count": np.array([counter[year] for year in years], np.int64)},
+            index=pd.Index([str(year) for year in years], name="year"),
+        )
+
+
+    def active_repository_lifespans(self) -> pd.DataFrame:
+        """Сколько активных репозиториев создано в каждом году."""
+        return self.__year_frame(self.__active_created)
+
+
+    def count_last_push(self) -> pd.DataFrame:
+        """Сколько репозиториев сделали свой последний коммит в каждом году."""
+        return self.__year_frame(self.__pushed)
+
+
+    def count_created_repo(self) -> pd.DataFrame:
+        """Сколько репозиториев было создано в каждом году."""
+        return self.__year_frame(self.__created)
+
+
+    def top_languages(self, n: int = 10) -> pd.DataFrame:
+        """
+        Самые частые языки всех репозиториев (оценка Space-Saving).
+        :return: DataFrame со столбцами: language, count, error - счет завышен не больше чем на error
+        """
+        return pd.DataFrame(
+            self.__languages.top(n), columns=["language", "count", "error"]
+        ).set_index("language")
+
+
+    def lifespan_percentiles(self, quantiles: Sequence[float] = QUANTILES) -> pd.DataFrame:
+        """
+        Процентили времени жизни репозитория в днях (оценка t-digest).
+        :return: DataFrame со столбцами: quantile, days
+        """
+        return pd.DataFrame(
+            {"days": [self.__lifespans.quantile(q) for q in quantiles]},
+            index=pd.Index(quantiles, name="quantile"),
+        )
+
+
+    def distinct_owners(self) -> int:
+        """Оценка числа различных владельцев репозиториев (HyperLogLog)."""
+        return round(self.__owners.estimate())
@@ -1,20 +1,81 @@
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Mapping
+
+
+SEARCH = "search" # категория лимитов для /search/*
+CORE = "core" # категория лимитов для остальных эндпоинтов
+
+# Лимиты GitHub для авторизованных запросов, пока заголовки еще не получены
+DEFAULT_LIMITS = {SEARCH: 30, CORE: 5000}
+
+# Запас к моменту сброса лимита на рассинхронизацию часов с GitHub
+RESET_SLACK = timedelta(seconds=1)
+
+
+class RateLimit:
+    """
+    Состояние одной категории лимита запросов токена.
+    Attributes:
+        remaining (int): Сколько запросов осталось до сброса.
+        reset_at (datetime | None): Время сброса лимита. `None`, если
+        GitHub еще не сообщил его.
+        paused_until (datetime | None): До какого времени категория
+        приостановлена вторичным лимитом. Пауза не меняет remaining
+        и reset_at основного лимита из заголовков.
+    """
+    def __init__(self, limit: int) -> None:
+        self.remaining = limit
+        self.reset_at: datetime | None = None
+        self.paused_until: datetime | None = None
+        self.__limit = limit
+
+
+    def get_remaining(self, now: datetime) -> int:
+        """
+        Остаток лимита с учетом того, что время сброса уже могло наступить.
+        Во время паузы - 0.
+        """
+        if self.reset_at is not None and now >= self.reset_at:
+            self.remaining = self.__limit
+            self.reset_at = None
+        if self.paused_until is not None:
+            if now < self.paused_until:
+                return 0
+            self.paused_until = None
+        return self.remaining
+
+
+    def available_at(self, now: datetime) -> datetime | None:
+        """Когда категория снова сможет сделать запрос. `None`, если время сброса неизвестно."""
+        wake_at = max(now, self.paused_until or now)
+        if self.remaining <= 0:
+            if self.reset_at is None:
+                return None
+            wake_at = max(wake_at, self.reset_at)
+        return wake_at
+
+
+    def update(self, limit: int, remaining: int, reset_at: datetime) -> None:
+        """Обновляет состояние по заголовкам ответа GitHub."""
+        self.__limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
 
 
 class Token:
     """
     Класс представляет один токен доступа,
-    отслеживает, когда он был в последний раз использован.
+    отслеживает остаток лимитов запросов по категориям.
     Attributes:
         value (str): Строковое значение токена, доступное только для чтения.
-        expired_at (datetime | None): Время, когда токен был использован
-        и стал временно недоступным. `None`, если токен "свежий".
     """
     def __init__(self, token: str) -> None:
         self.__value = token
-        self.__expired_at: datetime | None = None
+        self.__limits = {
+            resource: RateLimit(limit) for resource, limit in DEFAULT_LIMITS.items()
+        }
 
 
     @property
@@ -24,14 +85,78 @@ class Token:
 
 
     @property
-    def expired_at(self) -> datetime | None:
-        return self.__expired_at
+    def name(self) -> str:
+        """Неполное значение токена для логов и метрик."""
+        return f"...{self.__value[-4:]}"
+
 
+    def remaining(self, resource: str = SEARCH) -> int:
+        """Сколько запросов токен может сделать в категории прямо сейчас."""
+        return self.__limits[resource].get_remaining(datetime.now())
 
-    @expired_at.setter
-    def expired_at(self, expired_at: datetime) -> None:
-        """Устанавливает время 'истечения' токена после его использования."""
-        self.__expired_at = expired_at
+
+    def reset_at(self, resource: str = SEARCH) -> datetime | None:
+        """Время сброса лимита категории."""
+        return self.__limits[resource].reset_at
+
+
+    def available_at(self, resource: str = SEARCH) -> datetime | None:
+        """Когда токен снова сможет сделать запрос в категории (с учетом паузы)."""
+        return self.__limits[resource].available_at(datetime.now())
+
+
+    def reserve(self, resource: str = SEARCH) -> None:
+        """
+        Резервирует один запрос до прихода ответа, чтобы параллельные
+        запросы не выбрали один и тот же почти исчерпанный токен.
+        """
+        now = datetime.now()
+        limit = self.__limits[resource]
+        limit.remaining = max(limit.get_remaining(now) - 1, 0)
+        if limit.reset_at is None:
+            # Предварительное окно лимита, пока ответ не принес X-RateLimit-Reset
+            limit.reset_at = now + timedelta(minutes=1)
+
+
+    def update_rate_limit(self, headers: Mapping[str, str]) -> None:
+        """
+        Обновляет лимиты по заголовкам X-RateLimit-* и Retry-After ответа GitHub.
+        """
+        resource = headers.get("x-ratelimit-resource", SEARCH)
+        if resource not in self.__limits:
+            self.__limits[resource] = RateLimit(DEFAULT_LIMITS[CORE])
+
+        if headers.get("retry-after", "").isdigit():
+            self.pause(resource, datetime.now() + timedelta(seconds=int(headers["retry-after"])))
+
+        if "x-ratelimit-remaining" not in headers or "x-ratelimit-reset" not in headers:
+            return
+        self.__limits[resource].update(
+            limit=int(headers.get("x-ratelimit-limit", DEFAULT_LIMITS.get(resource, 0))),
+            remaining=int(headers["x-ratelimit-remaining"]),
+            reset_at=datetime.fromtimestamp(int(headers["x-ratelimit-reset"])),
+        )
+
+
+    def pause(self, resource: str, until: datetime) -> None:
+        """
+        Приостанавливает категорию до until после вторичного лимита.
+        Основной лимит не трогается: когда пауза кончится, токен продолжит
+        с остатком из заголовков, а не с полным лимитом.
+        """
+        limit = self.__limits[resource]
+        limit.paused_until = until
+
+
+    def exhaust(self, resource: str, reset_at: datetime | None = None) -> None:
+        """Помечает основной лимит категории исчерпанным до reset_at."""
+        limit = self.__limits[resource]
+        limit.remaining = 0
+        if reset_at is not None:
+            limit.reset_at = reset_at
+        elif limit.reset_at is None:
+            # GitHub не сообщил время сброса: окно search-лимита — одна минута
+            limit.reset_at = datetime.now() + timedelta(minutes=1)
 
 
 class NoTokenAvailable(Exception):
@@ -44,9 +169,13 @@ class TokenProvider:
 
     Attributes:
         __tokens (list[Token]): Список загруженных объектов Token.
+
+    Процессы распределенного обхода делят токены одного файла: процесс
+    с номером slot из slots берет каждый slots-й токен, начиная со slot,
+    чтобы лимит одного токена не расходовали несколько процессов.
     """
-    def __init__(self, path: str) -> None:
-        self.__tokens = self.__get_tokens(path)
+    def __init__(self, path: str, slot: int = 0, slots: int = 1) -> None:
+        self.__tokens = self.__get_tokens(path)[slot::slots]
 
 
     @staticmethod
@@ -76,20 +205,31 @@ class TokenProvider:
         return tokens
 
 
-    async def get_token(self) -> Token:
+    @property
+    def tokens(self) -> list[Token]:
+        """Все загруженные токены."""
+        return list(self.__tokens)
+
+
+    @staticmethod
+    async def acquire(token: Token, resource: str = SEARCH) -> Token:
         """
-        Асинхронно получает следующий доступный токен из пула.
+        Ждет, пока у токена появится лимит, и резервирует один запрос.
+        Каждый воркер закреплен за своим токеном, поэтому ждет ровно до
+        сброса лимита или конца паузы именно этого токена.
+
+        Args:
+            token (Token): Токен воркера.
+            resource (str): Категория лимита (search или core).
 
         Returns:
-            Token: Объект токена, готовый к использованию.
+            Token: Тот же токен, с зарезервированным запросом.
         """
-        while True:
-            for token in self.__tokens:
-                if token.expired_at is None:
-                    return token
-                if (datetime.now() - token.expired_at).total_seconds() >= 3660:
-                    token.expired_at = None
-                    return token
-                continue
-            await asyncio.sleep(3660)
-
+        while token.remaining(resource) <= 0:
+            # Без известного времени сброса - окно search-лимита, одна минута
+            wake_at = (token.available_at(resource) or datetime.now() + timedelta(minutes=1)) + RESET_SLACK
+            delay = max((wake_at - datetime.now()).total_seconds(), 0)
+            logging.info(f"Токен {token.name} исчерпан, ожидание сброса лимита {delay:.0f} с")
+            await asyncio.sleep(delay)
+        token.reserve(resource)
+        return token
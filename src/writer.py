@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from db_manager import DataBase, RepoRecord
+from metrics import QUEUE_DEPTH, registry
+
+
+class PageResult(NamedTuple):
+    """
+    Результат обработки одной страницы для записи в базу.
+    Attributes:
+        infos (list[RepoRecord]): Репозитории страницы.
+        query (str): Поисковый запрос страницы.
+        page (int): Номер страницы.
+        status (str): Итоговый статус страницы в журнале обхода.
+        total_count (int | None): Число результатов запроса по данным GitHub.
+        new_units (tuple[tuple[str, int, datetime, datetime, str], ...]): Единицы работы,
+        запланированные по этой странице.
+        attempts (int | None): Сколько попыток потрачено на неудачную страницу.
+        error (str | None): Описание ошибки неудачной страницы.
+        etag (str | None): ETag нового полного ответа на страницу.
+    """
+    infos: list[RepoRecord]
+    query: str
+    page: int
+    status: str
+    total_count: Optional[int] = None
+    new_units: tuple[tuple[str, int, datetime, datetime, str], ...] = ()
+    attempts: Optional[int] = None
+    error: Optional[str] = None
+    etag: Optional[str] = None
+
+
+class DbWriter:
+    """
+    Отдельная задача записи в базу.
+
+    Фетчеры кладут результаты страниц в ограниченную очередь и сразу идут
+    за следующей страницей; писатель разбирает очередь и записывает данные
+    крупными транзакциями. Когда писатель не успевает, очередь заполняется
+    и put приостанавливает фетчеры.
+    """
+    def __init__(self, db: DataBase, max_pending: int, flush_interval: float) -> None:
+        self.__db = db
+        self.__flush_interval = flush_interval
+        self.__queue: asyncio.Queue[PageResult | None] = asyncio.Queue(maxsize=max_pending)
+        self.__task: asyncio.Task | None = None
+
+
+    def start(self) -> None:
+        """Запускает задачу записи."""
+        registry.add_collector(self.__collect_metrics)
+        self.__task = asyncio.create_task(self.__run())
+
+
+    def __collect_metrics(self) -> None:
+        QUEUE_DEPTH.set(self.__queue.qsize(), "write")
+
+
+    async def put(self, result: PageResult) -> None:
+        """Ставит результат страницы в очередь записи, ожидая места в очереди."""
+        await self.__queue.put(result)
+
+
+    async def close(self) -> None:
+        """Дожидается записи всей очереди и сбрасывает накопленное в базу."""
+        if self.__task is None:
+            return
+        await self.__queue.put(None)
+        await self.__task
+        self.__task = None
+        registry.remove_collector(self.__collect_metrics)
+        await self.__db.flush()
+
+
+    async def __run(self) -> None:
+        while True:
+            try:
+                result = await asyncio.wait_for(self.__queue.get(), self.__flush_interval)
+            except asyncio.TimeoutError:
+                # Новых страниц нет: не держим накопленное в памяти
+                await self.__flush()
+                continue
+
+            if result is None:
+                return
+
+            try:
+                await self.__db.add_crawl_units(result.new_units)
+                await self.__db.add_repo_info(result.infos)
+                if result.etag is not None:
+                    await self.__db.add_page_etag(
+                        result.query, result.page, result.etag, result.total_count
+                    )
+                await self.__db.finish_crawl_unit(
+                    result.query,
+                    result.page,
+                    result.status,
+                    result.total_count,
+                    result.attempts,
+                    result.error,
+                )
+            except Exception as e:
+                # Страницы этой транзакции останутся в журнале незавершенными
+                # и будут загружены повторно при следующем запуске
+                logging.error(f"Ошибка записи в базу, {e}")
+
+
+    async def __flush(self) -> None:
+        try:
+            await self.__db.flush()
+        except Exception as e:
+            logging.error(f"Ошибка записи в базу, {e}")